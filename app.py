@@ -1,5 +1,8 @@
 import os
 import logging
+import multiprocessing
+import signal
+import threading
 from datetime import timedelta
 from pathlib import Path
 
@@ -9,6 +12,8 @@ from dotenv import load_dotenv
 from config import Config
 from models.user import init_db
 from routes import init_app as init_routes
+from services.mail_queue import mail_queue
+from services.outcome_writer import outcome_writer
 
 
 def _configure_logging(app):
@@ -25,6 +30,21 @@ def _configure_logging(app):
         app.logger.addHandler(handler)
 
 
+def _handle_sigterm(signum, _frame):
+    # waitress leaves SIGTERM at its default, which kills the process without
+    # running atexit; commit the queued outcomes first, then exit cleanly.
+    outcome_writer.flush()
+    raise SystemExit(128 + signum)
+
+
+def _install_sigterm_handler():
+    # Servers that manage SIGTERM themselves (gunicorn workers) keep theirs.
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _handle_sigterm)
+
+
 def create_app():
     env_file = os.getenv("ENV_FILE", ".env")
     env_path = Path(env_file)
@@ -49,6 +69,13 @@ def create_app():
 
     init_routes(app)
 
+    # Spawned inference workers re-import this module; only the parent process
+    # should run the mail senders.
+    if app.config["MAIL_QUEUE_ENABLED"] and multiprocessing.parent_process() is None:
+        mail_queue.start(app)
+    if multiprocessing.parent_process() is None:
+        _install_sigterm_handler()
+
     @app.after_request
     def apply_security_headers(response):
         response.headers["X-Content-Type-Options"] = "nosniff"
@@ -54,14 +54,57 @@ class Config:
     RESEND_API_KEY = os.getenv("RESEND_API_KEY", "").strip()
     RESEND_FROM_EMAIL = os.getenv("RESEND_FROM_EMAIL", "onboarding@resend.dev").strip()
     RESEND_USER_AGENT = os.getenv("RESEND_USER_AGENT", "eye-verification-system/1.0").strip()
+    MAIL_QUEUE_ENABLED = _env_bool("MAIL_QUEUE_ENABLED", default=True)
+    MAIL_QUEUE_WORKERS = int(os.getenv("MAIL_QUEUE_WORKERS", "2"))
+    MAIL_QUEUE_POLL_SECONDS = float(os.getenv("MAIL_QUEUE_POLL_SECONDS", "2"))
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv("MAIL_QUEUE_MAX_ATTEMPTS", "6"))
+    MAIL_QUEUE_BACKOFF_SECONDS = int(os.getenv("MAIL_QUEUE_BACKOFF_SECONDS", "15"))
+    MAIL_BREAKER_FAILURES = int(os.getenv("MAIL_BREAKER_FAILURES", "3"))
+    MAIL_BREAKER_RESET_SECONDS = int(os.getenv("MAIL_BREAKER_RESET_SECONDS", "60"))
     CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME", "").strip()
     CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY", "").strip()
     CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET", "").strip()
     CLOUDINARY_FOLDER = os.getenv("CLOUDINARY_FOLDER", "eye-verification").strip()
     ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+    TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "15"))
+    TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
 
     FRAME_CAPTURE_INTERVAL_MS = int(os.getenv("FRAME_CAPTURE_INTERVAL_MS", "200"))
+    FRAME_INTERVAL_MIN_MS = int(os.getenv("FRAME_INTERVAL_MIN_MS", "60"))
+    FRAME_INTERVAL_MAX_MS = int(os.getenv("FRAME_INTERVAL_MAX_MS", "2000"))
+    FRAME_INTERVAL_BLINK_FACTOR = float(os.getenv("FRAME_INTERVAL_BLINK_FACTOR", "0.5"))
+    LIVENESS_STREAM_ENABLED = _env_bool("LIVENESS_STREAM_ENABLED", default=False)
+    FRAME_UPLOAD_WIDTH = int(os.getenv("FRAME_UPLOAD_WIDTH", "320"))
+    FRAME_ROI_PADDING = float(os.getenv("FRAME_ROI_PADDING", "0.35"))
     LIVENESS_TIMEOUT_SECONDS = int(os.getenv("LIVENESS_TIMEOUT_SECONDS", "30"))
+    DETECTOR_POOL_SIZE = int(os.getenv("DETECTOR_POOL_SIZE", str(os.cpu_count() or 1)))
+    MAX_IN_FLIGHT_FRAMES = int(os.getenv("MAX_IN_FLIGHT_FRAMES", str(2 * DETECTOR_POOL_SIZE)))
+    MAX_ACTIVE_SESSIONS = int(os.getenv("MAX_ACTIVE_SESSIONS", "0"))
+    ADMISSION_RETRY_MS = int(os.getenv("ADMISSION_RETRY_MS", "500"))
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "thread").strip().lower()
+    EYE_DETECTOR_BACKEND = os.getenv("EYE_DETECTOR_BACKEND", "face_mesh").strip().lower()
+    CASCADE_FACE_PADDING = float(os.getenv("CASCADE_FACE_PADDING", "0.25"))
+    FACE_LANDMARKER_MODEL_PATH = os.getenv(
+        "FACE_LANDMARKER_MODEL_PATH",
+        os.path.join(BASE_DIR, "instance", "face_landmarker.task"),
+    )
+    INFERENCE_SHM_BYTES = int(os.getenv("INFERENCE_SHM_BYTES", str(1920 * 1080 * 3)))
+    LIVENESS_SESSION_STORE = os.getenv("LIVENESS_SESSION_STORE", "memory").strip().lower()
+    LIVENESS_SESSION_DB_PATH = os.getenv(
+        "LIVENESS_SESSION_DB_PATH",
+        os.path.join(BASE_DIR, "instance", "liveness_sessions.db"),
+    )
+    PREFILTER_ENABLED = _env_bool("PREFILTER_ENABLED", default=True)
+    PREFILTER_MIN_BRIGHTNESS = float(os.getenv("PREFILTER_MIN_BRIGHTNESS", "16"))
+    PREFILTER_MIN_DETAIL = float(os.getenv("PREFILTER_MIN_DETAIL", "8"))
+    PREFILTER_DUPLICATE_DIFF = int(os.getenv("PREFILTER_DUPLICATE_DIFF", "6"))
+    SHARPNESS_METHOD = os.getenv("SHARPNESS_METHOD", "laplacian32").strip().lower()
+    SHARPNESS_MAX_SIDE = int(os.getenv("SHARPNESS_MAX_SIDE", "0"))
+    SHARPNESS_MIN = float(os.getenv("SHARPNESS_MIN", "0"))
+    CAPTURE_PERSIST_WORKERS = int(os.getenv("CAPTURE_PERSIST_WORKERS", "2"))
+    CAPTURE_JPEG_QUALITY = int(os.getenv("CAPTURE_JPEG_QUALITY", "90"))
+    OUTCOME_BATCH_WINDOW_MS = int(os.getenv("OUTCOME_BATCH_WINDOW_MS", "0"))
+    OUTCOME_BATCH_MAX_SIZE = int(os.getenv("OUTCOME_BATCH_MAX_SIZE", "100"))
 
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(4 * 1024 * 1024)))
     SESSION_COOKIE_HTTPONLY = True
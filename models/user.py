@@ -1,27 +1,95 @@
+import hmac
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 
 from flask import current_app
 from sqlalchemy import (
     Column,
+    Float,
+    Index,
     Integer,
+    LargeBinary,
     MetaData,
     String,
     Table,
+    Text,
+    bindparam,
     create_engine,
     desc,
+    func,
     inspect,
     select,
     text,
     update,
 )
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
 
 VALID_STATUSES = {"PENDING", "VERIFIED", "FAILED"}
+ROLLUP_GRANULARITIES = {"minute": 16, "hour": 13}
 
 _ENGINE_CACHE = {}
 _METADATA = MetaData()
 
+
+class _TokenCache:
+    # One entry per email, so re-issuing a token or changing status only has
+    # to drop a single key.
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def get(self, email, token):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(email)
+            if entry is not None:
+                cached_token, user, expires_at = entry
+                if expires_at > now and hmac.compare_digest(cached_token, token):
+                    self.entries.move_to_end(email)
+                    self.hits += 1
+                    return user
+                if expires_at <= now:
+                    self.entries.pop(email, None)
+            self.misses += 1
+            return None
+
+    def put(self, email, token, user, generation, ttl_seconds, max_entries):
+        with self.lock:
+            # An invalidation that raced the DB read means the row may already be stale.
+            if generation != self.generation:
+                return
+            self.entries[email] = (token, user, time.monotonic() + ttl_seconds)
+            self.entries.move_to_end(email)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, email):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(email, None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_TOKEN_CACHE = _TokenCache()
+
 _USERS_TABLE = Table(
     "users",
     _METADATA,
@@ -45,6 +113,80 @@ _VERIFICATION_EVENTS_TABLE = Table(
     Column("created_at", String(64), nullable=False),
 )
 
+_USERS_TOKEN_INDEX = Index("ix_users_verification_token", _USERS_TABLE.c.verification_token)
+_USERS_EMAIL_TOKEN_INDEX = Index(
+    "ix_users_email_verification_token",
+    _USERS_TABLE.c.email,
+    _USERS_TABLE.c.verification_token,
+)
+_EVENTS_EMAIL_INDEX = Index("ix_verification_events_email", _VERIFICATION_EVENTS_TABLE.c.email)
+_EVENTS_CREATED_AT_INDEX = Index(
+    "ix_verification_events_created_at",
+    _VERIFICATION_EVENTS_TABLE.c.created_at,
+)
+
+_SCHEMA_MIGRATIONS_TABLE = Table(
+    "schema_migrations",
+    _METADATA,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", String(64), nullable=False),
+)
+
+_OUTBOUND_EMAILS_TABLE = Table(
+    "outbound_emails",
+    _METADATA,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("recipient", String(255), nullable=False),
+    Column("token", String(512), nullable=False),
+    Column("base_url", String(1024), nullable=False, server_default=text("''")),
+    Column("status", String(20), nullable=False, server_default=text("'QUEUED'")),
+    Column("attempts", Integer, nullable=False, server_default=text("0")),
+    Column("next_attempt_at", Float, nullable=False),
+    Column("claimed_at", Float, nullable=False, server_default=text("0")),
+    Column("last_error", String(1000), nullable=False, server_default=text("''")),
+    Column("created_at", String(64), nullable=False),
+    Index("ix_outbound_emails_status_next_attempt", "status", "next_attempt_at"),
+)
+
+# Event counts per (granularity, bucket, status, reason), kept current by
+# log_verification_event so stats never scan verification_events. bucket is
+# the UTC created_at prefix: "2024-05-01T13:45" (minute) or "2024-05-01T13" (hour).
+_EVENT_ROLLUPS_TABLE = Table(
+    "verification_event_rollups",
+    _METADATA,
+    Column("granularity", String(10), primary_key=True),
+    Column("bucket", String(16), primary_key=True),
+    Column("status", String(20), primary_key=True),
+    Column("reason", String(500), primary_key=True),
+    Column("events", Integer, nullable=False, server_default=text("0")),
+    Column("open_captured", Integer, nullable=False, server_default=text("0")),
+    Column("closed_captured", Integer, nullable=False, server_default=text("0")),
+    Column("both_captured", Integer, nullable=False, server_default=text("0")),
+)
+_ROLLUP_KEYS = ("granularity", "bucket", "status", "reason")
+_ROLLUP_COUNTERS = ("events", "open_captured", "closed_captured", "both_captured")
+
+_LIVENESS_SESSIONS_TABLE = Table(
+    "liveness_sessions",
+    _METADATA,
+    Column("session_key", String(600), primary_key=True),
+    Column("started_at", Float, nullable=False, index=True),
+    Column("state", Text, nullable=False),
+    Column("version", Integer, nullable=False, server_default=text("0")),
+)
+
+# Best capture per eye of an in-progress session, kept out of the session
+# state so frames that only touch flags and scores do not rewrite JPEGs.
+_LIVENESS_SESSION_CAPTURES_TABLE = Table(
+    "liveness_session_captures",
+    _METADATA,
+    Column("session_key", String(600), primary_key=True),
+    Column("eye", String(10), primary_key=True),
+    Column("started_at", Float, nullable=False, index=True),
+    Column("image", LargeBinary, nullable=False),
+)
+
 
 def _normalize_database_url(database_url):
     if database_url.startswith("postgres://"):
@@ -85,11 +227,11 @@ def _row_to_dict(row):
 def init_db():
     engine: Engine = get_engine()
     _METADATA.create_all(engine)
-    _ensure_verification_events_columns(engine)
+    _apply_migrations(engine)
 
 
-def _ensure_verification_events_columns(engine: Engine):
-    inspector = inspect(engine)
+def _add_capture_ref_columns(connection):
+    inspector = inspect(connection)
     if not inspector.has_table("verification_events"):
         return
 
@@ -99,15 +241,97 @@ def _ensure_verification_events_columns(engine: Engine):
         "closed_capture_ref": "VARCHAR(1024) NOT NULL DEFAULT ''",
     }
 
-    with engine.begin() as connection:
-        for column_name, definition in required.items():
-            if column_name in existing:
-                continue
+    for column_name, definition in required.items():
+        if column_name in existing:
+            continue
+        connection.execute(
+            text(f"ALTER TABLE verification_events ADD COLUMN {column_name} {definition}")
+        )
+
+
+def _add_liveness_session_version(connection):
+    inspector = inspect(connection)
+    if not inspector.has_table("liveness_sessions"):
+        return
+    existing = {col["name"] for col in inspector.get_columns("liveness_sessions")}
+    if "version" not in existing:
+        connection.execute(
+            text("ALTER TABLE liveness_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        )
+
+
+def _add_lookup_indexes(connection):
+    for index in (
+        _USERS_TOKEN_INDEX,
+        _USERS_EMAIL_TOKEN_INDEX,
+        _EVENTS_EMAIL_INDEX,
+        _EVENTS_CREATED_AT_INDEX,
+    ):
+        index.create(connection, checkfirst=True)
+
+
+def _backfill_event_rollups(connection):
+    # Rebuilt from scratch inside the migration transaction, so a concurrent
+    # worker that loses the schema_migrations insert rolls its copy back.
+    events = _VERIFICATION_EVENTS_TABLE
+    connection.execute(_EVENT_ROLLUPS_TABLE.delete())
+    for granularity, prefix_length in ROLLUP_GRANULARITIES.items():
+        bucket = func.substr(events.c.created_at, 1, prefix_length)
+        rows = connection.execute(
+            select(
+                bucket.label("bucket"),
+                events.c.status,
+                events.c.reason,
+                func.count().label("events"),
+                func.sum(events.c.open_captured).label("open_captured"),
+                func.sum(events.c.closed_captured).label("closed_captured"),
+                func.sum(events.c.open_captured * events.c.closed_captured).label("both_captured"),
+            ).group_by(bucket, events.c.status, events.c.reason)
+        ).fetchall()
+        if rows:
             connection.execute(
-                text(f"ALTER TABLE verification_events ADD COLUMN {column_name} {definition}")
+                _EVENT_ROLLUPS_TABLE.insert(),
+                [dict(row._mapping, granularity=granularity) for row in rows],
             )
 
 
+# Append-only: each entry runs once per database, in order, and must be safe to
+# re-run because several workers may start at the same time.
+_MIGRATIONS = (
+    (1, "verification_events_capture_refs", _add_capture_ref_columns),
+    (2, "lookup_indexes", _add_lookup_indexes),
+    (3, "verification_event_rollups", _backfill_event_rollups),
+    (4, "liveness_session_versions", _add_liveness_session_version),
+)
+
+
+def _applied_migration_versions(engine: Engine):
+    with engine.begin() as connection:
+        return set(connection.execute(select(_SCHEMA_MIGRATIONS_TABLE.c.version)).scalars())
+
+
+def _apply_migrations(engine: Engine):
+    applied = _applied_migration_versions(engine)
+    for version, name, migrate in _MIGRATIONS:
+        if version in applied:
+            continue
+
+        try:
+            with engine.begin() as connection:
+                migrate(connection)
+                connection.execute(
+                    _SCHEMA_MIGRATIONS_TABLE.insert().values(
+                        version=version,
+                        name=name,
+                        applied_at=datetime.now(timezone.utc).isoformat(),
+                    )
+                )
+        except DBAPIError:
+            # A concurrent worker may have applied the same migration first.
+            if version not in _applied_migration_versions(engine):
+                raise
+
+
 def create_or_update_user(email, token):
     engine = get_engine()
     with engine.begin() as connection:
@@ -121,16 +345,22 @@ def create_or_update_user(email, token):
                 .where(_USERS_TABLE.c.email == email)
                 .values(verification_token=token, status="PENDING")
             )
-            return "updated"
-
-        connection.execute(
-            _USERS_TABLE.insert().values(
-                email=email,
-                verification_token=token,
-                status="PENDING",
+            outcome = "updated"
+        else:
+            connection.execute(
+                _USERS_TABLE.insert().values(
+                    email=email,
+                    verification_token=token,
+                    status="PENDING",
+                )
             )
-        )
-        return "created"
+            outcome = "created"
+
+    # Only after the commit: a lookup that read the old token before it is
+    # refused by the generation check instead of caching the old token again.
+    if outcome == "updated":
+        _TOKEN_CACHE.invalidate(email)
+    return outcome
 
 
 def get_user_by_email(email):
@@ -178,6 +408,29 @@ def get_user_by_email_and_token(email, token):
     return _row_to_dict(row)
 
 
+def get_user_by_email_and_token_cached(email, token):
+    user = _TOKEN_CACHE.get(email, token)
+    if user is not None:
+        return user
+
+    generation = _TOKEN_CACHE.generation
+    user = get_user_by_email_and_token(email, token)
+    if user:
+        _TOKEN_CACHE.put(
+            email,
+            token,
+            user,
+            generation,
+            ttl_seconds=current_app.config.get("TOKEN_CACHE_TTL_SECONDS", 15),
+            max_entries=current_app.config.get("TOKEN_CACHE_MAX_ENTRIES", 10000),
+        )
+    return user
+
+
+def get_token_cache_stats():
+    return _TOKEN_CACHE.stats()
+
+
 def update_user_status(email, status):
     normalized_status = status.upper()
     if normalized_status not in VALID_STATUSES:
@@ -190,9 +443,10 @@ def update_user_status(email, status):
             .where(_USERS_TABLE.c.email == email)
             .values(status=normalized_status)
         )
+    _TOKEN_CACHE.invalidate(email)
 
 
-def log_verification_event(
+def _verification_event_row(
     email,
     status,
     reason="",
@@ -200,45 +454,482 @@ def log_verification_event(
     closed_captured=False,
     open_capture_ref="",
     closed_capture_ref="",
+    created_at=None,
 ):
     normalized_status = status.upper()
     if normalized_status not in VALID_STATUSES:
         raise ValueError(f"Invalid user status for event log: {status}")
 
-    created_at = datetime.now(timezone.utc).isoformat()
+    return {
+        "email": email,
+        "status": normalized_status,
+        "reason": reason or "",
+        "open_captured": int(bool(open_captured)),
+        "closed_captured": int(bool(closed_captured)),
+        "open_capture_ref": open_capture_ref or "",
+        "closed_capture_ref": closed_capture_ref or "",
+        "created_at": created_at or datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def log_verification_event(
+    email,
+    status,
+    reason="",
+    open_captured=False,
+    closed_captured=False,
+    open_capture_ref="",
+    closed_capture_ref="",
+):
+    row = _verification_event_row(
+        email,
+        status,
+        reason,
+        open_captured,
+        closed_captured,
+        open_capture_ref,
+        closed_capture_ref,
+    )
+    engine = get_engine()
+    with engine.begin() as connection:
+        event_ids = _insert_verification_events(connection, [row])
+        _increment_event_rollups(connection, [row])
+    return event_ids[0]
+
+
+def record_verification_outcomes(outcomes):
+    # Terminal results of one or more sessions in a single transaction: each
+    # user's status update plus a multi-row event insert and the rollups.
+    # outcomes are dicts with email, status and optionally reason,
+    # open_captured, closed_captured and token. With a token the status only
+    # changes while that token is still the user's and the check is PENDING,
+    # so a late outcome of an older attempt is logged without touching a
+    # newer one. Returns the event ids in input order.
+    statuses = {}
+    guarded_statuses = {}
+    rows = []
+    for outcome in outcomes:
+        row = _verification_event_row(
+            outcome["email"],
+            outcome["status"],
+            outcome.get("reason", ""),
+            outcome.get("open_captured", False),
+            outcome.get("closed_captured", False),
+        )
+        rows.append(row)
+        if outcome.get("token"):
+            guarded_statuses[row["email"]] = (outcome["token"], row["status"])
+        else:
+            statuses[row["email"]] = row["status"]
+    if not rows:
+        return []
+
     engine = get_engine()
     with engine.begin() as connection:
+        if statuses:
+            connection.execute(
+                update(_USERS_TABLE)
+                .where(_USERS_TABLE.c.email == bindparam("target_email"))
+                .values(status=bindparam("new_status")),
+                [
+                    {"target_email": email, "new_status": status}
+                    for email, status in statuses.items()
+                ],
+            )
+        if guarded_statuses:
+            connection.execute(
+                update(_USERS_TABLE)
+                .where(
+                    (_USERS_TABLE.c.email == bindparam("target_email"))
+                    & (_USERS_TABLE.c.verification_token == bindparam("target_token"))
+                    & (_USERS_TABLE.c.status == "PENDING")
+                )
+                .values(status=bindparam("new_status")),
+                [
+                    {"target_email": email, "target_token": token, "new_status": status}
+                    for email, (token, status) in guarded_statuses.items()
+                ],
+            )
+        event_ids = _insert_verification_events(connection, rows)
+        _increment_event_rollups(connection, rows)
+
+    for email in (*statuses, *guarded_statuses):
+        _TOKEN_CACHE.invalidate(email)
+    return event_ids
+
+
+def _insert_verification_events(connection, rows):
+    table = _VERIFICATION_EVENTS_TABLE
+    if len(rows) > 1 and connection.dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = connection.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True),
+            rows,
+        )
+        return list(result.scalars())
+
+    return [connection.execute(table.insert().values(**row)).inserted_primary_key[0] for row in rows]
+
+
+def _increment_event_rollups(connection, rows):
+    # Events of a batch that share a bucket collapse into one upsert.
+    totals = {}
+    for row in rows:
+        for granularity, prefix_length in ROLLUP_GRANULARITIES.items():
+            keys = (granularity, row["created_at"][:prefix_length], row["status"], row["reason"])
+            counters = totals.setdefault(keys, dict.fromkeys(_ROLLUP_COUNTERS, 0))
+            counters["events"] += 1
+            counters["open_captured"] += row["open_captured"]
+            counters["closed_captured"] += row["closed_captured"]
+            counters["both_captured"] += row["open_captured"] * row["closed_captured"]
+
+    for keys, counters in totals.items():
+        _upsert_rollup(connection, dict(zip(_ROLLUP_KEYS, keys)), counters)
+
+
+def _upsert_rollup(connection, keys, counters):
+    table = _EVENT_ROLLUPS_TABLE
+    dialect_insert = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}.get(
+        connection.dialect.name
+    )
+    if dialect_insert is not None:
+        statement = dialect_insert(table).values(**keys, **counters)
         connection.execute(
-            _VERIFICATION_EVENTS_TABLE.insert().values(
-                email=email,
-                status=normalized_status,
-                reason=reason or "",
-                open_captured=int(bool(open_captured)),
-                closed_captured=int(bool(closed_captured)),
-                open_capture_ref=open_capture_ref or "",
-                closed_capture_ref=closed_capture_ref or "",
-                created_at=created_at,
+            statement.on_conflict_do_update(
+                index_elements=list(_ROLLUP_KEYS),
+                set_={name: table.c[name] + statement.excluded[name] for name in _ROLLUP_COUNTERS},
             )
         )
+        return
 
+    # Other dialects: update first, insert on a miss, and retry the update if a
+    # concurrent writer inserted the same bucket in between.
+    match = [table.c[name] == value for name, value in keys.items()]
+    increments = {name: table.c[name] + value for name, value in counters.items()}
+    if connection.execute(update(table).where(*match).values(**increments)).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(**keys, **counters))
+    except IntegrityError:
+        connection.execute(update(table).where(*match).values(**increments))
 
-def get_recent_verification_events(limit=100):
-    safe_limit = max(1, min(int(limit), 500))
+
+def get_verification_event_rollups(granularity, bucket_from, bucket_to):
+    # Inclusive bucket range, oldest first.
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"Invalid rollup granularity: {granularity}")
+
+    table = _EVENT_ROLLUPS_TABLE
     engine = get_engine()
     with engine.begin() as connection:
         rows = connection.execute(
             select(
-                _VERIFICATION_EVENTS_TABLE.c.id,
-                _VERIFICATION_EVENTS_TABLE.c.email,
-                _VERIFICATION_EVENTS_TABLE.c.status,
-                _VERIFICATION_EVENTS_TABLE.c.reason,
-                _VERIFICATION_EVENTS_TABLE.c.open_captured,
-                _VERIFICATION_EVENTS_TABLE.c.closed_captured,
-                _VERIFICATION_EVENTS_TABLE.c.open_capture_ref,
-                _VERIFICATION_EVENTS_TABLE.c.closed_capture_ref,
-                _VERIFICATION_EVENTS_TABLE.c.created_at,
-            )
-            .order_by(desc(_VERIFICATION_EVENTS_TABLE.c.id))
-            .limit(safe_limit)
+                table.c.bucket,
+                table.c.status,
+                table.c.reason,
+                *(table.c[name] for name in _ROLLUP_COUNTERS),
+            )
+            .where(
+                (table.c.granularity == granularity)
+                & (table.c.bucket >= bucket_from)
+                & (table.c.bucket <= bucket_to)
+            )
+            .order_by(table.c.bucket)
         ).fetchall()
     return [dict(row._mapping) for row in rows]
+
+
+def update_verification_event_refs(event_id, open_capture_ref=None, closed_capture_ref=None):
+    values = {}
+    if open_capture_ref is not None:
+        values["open_capture_ref"] = open_capture_ref
+    if closed_capture_ref is not None:
+        values["closed_capture_ref"] = closed_capture_ref
+    if not values:
+        return
+
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            update(_VERIFICATION_EVENTS_TABLE)
+            .where(_VERIFICATION_EVENTS_TABLE.c.id == event_id)
+            .values(**values)
+        )
+
+
+_EVENT_EXPORT_COLUMNS = (
+    _VERIFICATION_EVENTS_TABLE.c.id,
+    _VERIFICATION_EVENTS_TABLE.c.email,
+    _VERIFICATION_EVENTS_TABLE.c.status,
+    _VERIFICATION_EVENTS_TABLE.c.reason,
+    _VERIFICATION_EVENTS_TABLE.c.open_captured,
+    _VERIFICATION_EVENTS_TABLE.c.closed_captured,
+    _VERIFICATION_EVENTS_TABLE.c.open_capture_ref,
+    _VERIFICATION_EVENTS_TABLE.c.closed_capture_ref,
+    _VERIFICATION_EVENTS_TABLE.c.created_at,
+)
+EVENT_EXPORT_FIELDS = tuple(column.name for column in _EVENT_EXPORT_COLUMNS)
+
+
+def normalize_event_timestamp(value):
+    # created_at is stored as a UTC ISO-8601 string, so range filters compare
+    # strings in that same form. Naive inputs are taken as UTC.
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def _verification_event_query(status=None, email=None, created_from=None, created_to=None):
+    table = _VERIFICATION_EVENTS_TABLE
+    query = select(*_EVENT_EXPORT_COLUMNS)
+    if status:
+        normalized_status = status.upper()
+        if normalized_status not in VALID_STATUSES:
+            raise ValueError(f"Invalid user status filter: {status}")
+        query = query.where(table.c.status == normalized_status)
+    if email:
+        query = query.where(table.c.email == email.strip().lower())
+    if created_from:
+        query = query.where(table.c.created_at >= normalize_event_timestamp(created_from))
+    if created_to:
+        query = query.where(table.c.created_at < normalize_event_timestamp(created_to))
+    return query
+
+
+def get_verification_events_page(limit=100, before_id=None, **filters):
+    # Keyset pagination, newest first: pass the last id of a page as before_id
+    # to get the next one. Cost does not grow with the page number.
+    safe_limit = max(1, min(int(limit), 500))
+    query = _verification_event_query(**filters)
+    if before_id is not None:
+        query = query.where(_VERIFICATION_EVENTS_TABLE.c.id < int(before_id))
+    query = query.order_by(desc(_VERIFICATION_EVENTS_TABLE.c.id)).limit(safe_limit)
+
+    engine = get_engine()
+    with engine.begin() as connection:
+        rows = connection.execute(query).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+def iter_verification_events(batch_size=1000, **filters):
+    # Oldest first over a server-side cursor, fetched batch_size rows at a
+    # time. The engine is resolved here so the returned generator can be
+    # consumed outside the app context (e.g. by a streaming response).
+    query = _verification_event_query(**filters).order_by(_VERIFICATION_EVENTS_TABLE.c.id)
+    return _stream_rows(get_engine(), query, batch_size)
+
+
+def _stream_rows(engine, query, batch_size):
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True,
+            yield_per=batch_size,
+        ).execute(query)
+        for row in result:
+            yield dict(row._mapping)
+
+
+def load_liveness_session_state(session_key):
+    # Returns (state, version) or None; the version is handed back to
+    # save_liveness_session_state so concurrent writers cannot overwrite each other.
+    engine = get_engine()
+    with engine.begin() as connection:
+        row = connection.execute(
+            select(
+                _LIVENESS_SESSIONS_TABLE.c.state,
+                _LIVENESS_SESSIONS_TABLE.c.version,
+            ).where(_LIVENESS_SESSIONS_TABLE.c.session_key == session_key)
+        ).first()
+    return (row.state, row.version) if row else None
+
+
+def _write_liveness_session_captures(connection, session_key, started_at, captures, clear):
+    table = _LIVENESS_SESSION_CAPTURES_TABLE
+    if clear:
+        connection.execute(table.delete().where(table.c.session_key == session_key))
+        return
+    for eye, image in captures.items():
+        connection.execute(
+            table.delete().where((table.c.session_key == session_key) & (table.c.eye == eye))
+        )
+        connection.execute(
+            table.insert().values(
+                session_key=session_key,
+                eye=eye,
+                started_at=started_at,
+                image=image,
+            )
+        )
+
+
+def save_liveness_session_state(
+    session_key,
+    started_at,
+    state,
+    version=None,
+    captures=None,
+    clear_captures=False,
+):
+    # Compare-and-swap: version is what the caller loaded (None for a new
+    # session). Returns the new version, or None when another process wrote
+    # the session in between and this write was rejected. captures
+    # ({eye: jpeg bytes}, only the ones that improved) and clear_captures are
+    # applied in the same transaction, so a rejected write leaves them alone.
+    engine = get_engine()
+    if version is None:
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    _LIVENESS_SESSIONS_TABLE.insert().values(
+                        session_key=session_key,
+                        started_at=started_at,
+                        state=state,
+                        version=1,
+                    )
+                )
+                _write_liveness_session_captures(
+                    connection, session_key, started_at, captures or {}, clear_captures
+                )
+        except IntegrityError:
+            return None
+        return 1
+
+    with engine.begin() as connection:
+        updated = connection.execute(
+            update(_LIVENESS_SESSIONS_TABLE)
+            .where(_LIVENESS_SESSIONS_TABLE.c.session_key == session_key)
+            .where(_LIVENESS_SESSIONS_TABLE.c.version == version)
+            .values(started_at=started_at, state=state, version=version + 1)
+        ).rowcount
+        if not updated:
+            return None
+        _write_liveness_session_captures(
+            connection, session_key, started_at, captures or {}, clear_captures
+        )
+    return version + 1
+
+
+def load_liveness_session_captures(session_key):
+    table = _LIVENESS_SESSION_CAPTURES_TABLE
+    engine = get_engine()
+    with engine.begin() as connection:
+        rows = connection.execute(
+            select(table.c.eye, table.c.image).where(table.c.session_key == session_key)
+        ).fetchall()
+    return {row.eye: bytes(row.image) for row in rows}
+
+
+def delete_liveness_session_state(session_key):
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            _LIVENESS_SESSION_CAPTURES_TABLE.delete().where(
+                _LIVENESS_SESSION_CAPTURES_TABLE.c.session_key == session_key
+            )
+        )
+        connection.execute(
+            _LIVENESS_SESSIONS_TABLE.delete().where(
+                _LIVENESS_SESSIONS_TABLE.c.session_key == session_key
+            )
+        )
+
+
+def purge_liveness_session_states(started_before):
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            _LIVENESS_SESSION_CAPTURES_TABLE.delete().where(
+                _LIVENESS_SESSION_CAPTURES_TABLE.c.started_at < started_before
+            )
+        )
+        result = connection.execute(
+            _LIVENESS_SESSIONS_TABLE.delete().where(
+                _LIVENESS_SESSIONS_TABLE.c.started_at < started_before
+            )
+        )
+    return result.rowcount
+
+
+def enqueue_outbound_email(recipient, token, base_url=""):
+    engine = get_engine()
+    with engine.begin() as connection:
+        # A re-issue makes earlier links useless; drop their unsent rows
+        # (and the plaintext tokens they hold) instead of mailing them later.
+        connection.execute(
+            update(_OUTBOUND_EMAILS_TABLE)
+            .where(_OUTBOUND_EMAILS_TABLE.c.recipient == recipient)
+            .where(_OUTBOUND_EMAILS_TABLE.c.status == "QUEUED")
+            .values(status="SUPERSEDED", token="")
+        )
+        result = connection.execute(
+            _OUTBOUND_EMAILS_TABLE.insert().values(
+                recipient=recipient,
+                token=token,
+                base_url=base_url or "",
+                status="QUEUED",
+                attempts=0,
+                next_attempt_at=time.time(),
+                claimed_at=0,
+                last_error="",
+                created_at=datetime.now(timezone.utc).isoformat(),
+            )
+        )
+    return result.inserted_primary_key[0]
+
+
+def claim_outbound_emails(limit, stale_after_seconds):
+    # Rows are claimed with a conditional UPDATE so several workers (or several
+    # app processes) can poll the same table without double-sending. SENDING
+    # rows whose claim is older than stale_after_seconds belong to a worker
+    # that died mid-send and are picked up again.
+    now = time.time()
+    table = _OUTBOUND_EMAILS_TABLE
+    due = (table.c.status == "QUEUED") & (table.c.next_attempt_at <= now)
+    stale = (table.c.status == "SENDING") & (table.c.claimed_at < now - stale_after_seconds)
+
+    engine = get_engine()
+    with engine.begin() as connection:
+        candidates = connection.execute(
+            select(table.c.id, table.c.recipient, table.c.token, table.c.base_url, table.c.attempts)
+            .where(due | stale)
+            .order_by(table.c.next_attempt_at)
+            .limit(limit)
+        ).fetchall()
+
+    claimed = []
+    for row in candidates:
+        with engine.begin() as connection:
+            result = connection.execute(
+                update(table)
+                .where((table.c.id == row.id) & (due | stale))
+                .values(status="SENDING", claimed_at=now)
+            )
+        if result.rowcount:
+            claimed.append(dict(row._mapping))
+    return claimed
+
+
+def complete_outbound_email(email_id):
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            update(_OUTBOUND_EMAILS_TABLE)
+            .where(_OUTBOUND_EMAILS_TABLE.c.id == email_id)
+            .values(status="SENT", token="", last_error="")
+        )
+
+
+def retry_outbound_email(email_id, attempts, next_attempt_at, error, give_up=False):
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            update(_OUTBOUND_EMAILS_TABLE)
+            .where(_OUTBOUND_EMAILS_TABLE.c.id == email_id)
+            .values(
+                status="FAILED" if give_up else "QUEUED",
+                attempts=attempts,
+                next_attempt_at=next_attempt_at,
+                last_error=(error or "")[:1000],
+            )
+        )
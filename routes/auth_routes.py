@@ -16,7 +16,8 @@ from models.user import (
     get_user_by_email,
     get_user_by_token,
 )
-from services.email_service import send_verification_email
+from services.email_service import is_email_provider_configured, send_verification_email
+from services.mail_queue import mail_queue
 from utils.token_utils import generate_verification_token
 
 
@@ -34,6 +35,19 @@ def _verification_base_url():
     return request.host_url.rstrip("/")
 
 
+def _dispatch_verification_email(email, token):
+    # Hands the send to the background queue when a provider is configured so
+    # the request never waits on provider timeouts. Without credentials the
+    # synchronous path still logs the local verification link.
+    base_url = _verification_base_url()
+    if current_app.config["MAIL_QUEUE_ENABLED"] and is_email_provider_configured():
+        mail_queue.enqueue(email, token, base_url)
+        return True, ""
+
+    sent, _, error = send_verification_email(email, token, base_url_override=base_url)
+    return sent, error
+
+
 @auth_bp.route("/")
 def root():
     return redirect(url_for("auth.register"))
@@ -54,11 +68,7 @@ def register():
         token = generate_verification_token()
         action = create_or_update_user(email, token)
 
-        sent, _, error = send_verification_email(
-            email,
-            token,
-            base_url_override=_verification_base_url(),
-        )
+        sent, error = _dispatch_verification_email(email, token)
         if sent:
             if action == "updated":
                 flash(
@@ -98,11 +108,7 @@ def resend_verification():
     token = generate_verification_token()
     create_or_update_user(email, token)
 
-    sent, _, error = send_verification_email(
-        email,
-        token,
-        base_url_override=_verification_base_url(),
-    )
+    sent, error = _dispatch_verification_email(email, token)
     if sent:
         flash("New verification email sent. Open the link from your inbox.", "success")
     else:
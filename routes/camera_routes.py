@@ -1,6 +1,11 @@
 import hmac
 import csv
 import io
+import json
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote
 
 from flask import (
     Blueprint,
@@ -16,16 +21,52 @@ from flask import (
 )
 
 from models.user import (
-    get_recent_verification_events,
+    EVENT_EXPORT_FIELDS,
+    ROLLUP_GRANULARITIES,
+    VALID_STATUSES,
     get_user_by_email,
+    get_token_cache_stats,
     get_user_by_email_and_token,
-    log_verification_event,
-    update_user_status,
+    get_user_by_email_and_token_cached,
+    get_verification_event_rollups,
+    get_verification_events_page,
+    iter_verification_events,
+    normalize_event_timestamp,
 )
+from services.capture_persistence import capture_persister
+from services.face_detection import FrameRegion
 from services.liveness_check import liveness_manager
+from services.metrics import observe_stage, registry
+from services.outcome_writer import outcome_writer
+from utils.image_utils import read_stream_into_buffer
+
+try:
+    from flask_sock import Sock
+except Exception:  # pragma: no cover - optional dependency at runtime
+    Sock = None
 
 
 camera_bp = Blueprint("camera", __name__)
+sock = Sock() if Sock is not None else None
+BINARY_FRAME_MIMETYPES = {"image/jpeg", "application/octet-stream"}
+STREAM_IDLE_TIMEOUT_SECONDS = 15
+
+
+def _read_frame_request():
+    if request.mimetype in BINARY_FRAME_MIMETYPES:
+        # Raw JPEG body: identity travels in headers and the body is read straight
+        # into one buffer that the decoder wraps without further copies.
+        email = unquote(request.headers.get("X-Verification-Email", ""))
+        token = request.headers.get("X-Verification-Token", "")
+        region = FrameRegion.parse(request.headers.get("X-Frame-Region", ""))
+        if request.content_length:
+            image_data = read_stream_into_buffer(request.stream, request.content_length)
+        else:
+            image_data = request.get_data(cache=False)
+        return email, token, image_data, region
+
+    payload = request.get_json(silent=True) or {}
+    return payload.get("email") or "", payload.get("token") or "", payload.get("image"), None
 
 
 @camera_bp.route("/camera")
@@ -47,17 +88,22 @@ def camera_page():
         email=email,
         token=token,
         frame_interval_ms=current_app.config["FRAME_CAPTURE_INTERVAL_MS"],
+        upload_width=current_app.config.get("FRAME_UPLOAD_WIDTH", 0),
+        roi_padding=current_app.config.get("FRAME_ROI_PADDING", 0.0),
+        stream_enabled=bool(
+            sock is not None and current_app.config.get("LIVENESS_STREAM_ENABLED", False)
+        ),
     )
 
 
 @camera_bp.route("/process_frame", methods=["POST"])
 def process_frame():
-    payload = request.get_json(silent=True) or {}
+    fallback_email, fallback_token, image_data, region = _read_frame_request()
 
-    # Primary source is server session; payload is a fallback for environments
-    # where session cookies are not persisted reliably.
-    email = session.get("verified_email") or (payload.get("email") or "").strip().lower()
-    token = session.get("verified_token") or (payload.get("token") or "").strip()
+    # Primary source is server session; payload/headers are a fallback for
+    # environments where session cookies are not persisted reliably.
+    email = session.get("verified_email") or fallback_email.strip().lower()
+    token = session.get("verified_token") or fallback_token.strip()
     if not email or not token:
         return (
             jsonify(
@@ -69,70 +115,173 @@ def process_frame():
             401,
         )
 
-    user = get_user_by_email_and_token(email, token)
+    started = time.perf_counter()
+    user = get_user_by_email_and_token_cached(email, token)
+    observe_stage("token_lookup", (time.perf_counter() - started) * 1000.0)
     if not user:
         return jsonify({"state": "failed", "message": "Invalid verification token."}), 403
+    if user["status"] != "PENDING":
+        _close_verification_session(email)
+        return jsonify(_finished_result(user))
 
-    image_data = payload.get("image")
     if not image_data:
         return jsonify({"state": "pending", "message": "No frame provided."}), 400
 
     try:
-        result = liveness_manager.process_frame(email=email, token=token, image_data=image_data)
-    except Exception as exc:
-        current_app.logger.exception("Frame processing failed unexpectedly: %s", exc)
-        update_user_status(email, "FAILED")
-        log_verification_event(
+        result = liveness_manager.process_frame(
             email=email,
-            status="FAILED",
-            reason="internal_processing_error",
-            open_captured=False,
-            closed_captured=False,
-            open_capture_ref="",
-            closed_capture_ref="",
+            token=token,
+            image_data=image_data,
+            region=region,
         )
-        session["result_email"] = email
-        session.pop("verified_email", None)
-        session.pop("verified_token", None)
+    except Exception as exc:
+        current_app.logger.exception("Frame processing failed unexpectedly: %s", exc)
+        _record_outcome(email, "FAILED", "internal_processing_error", {})
+        _close_verification_session(email)
         return jsonify({"state": "failed", "message": "Internal processing error."}), 500
 
-    if result["state"] == "verified":
-        update_user_status(email, "VERIFIED")
-        log_verification_event(
-            email=email,
-            status="VERIFIED",
-            reason=result.get("message", ""),
-            open_captured=result.get("open_captured", False),
-            closed_captured=result.get("closed_captured", False),
-            open_capture_ref=result.get("open_capture_ref", ""),
-            closed_capture_ref=result.get("closed_capture_ref", ""),
-        )
-        session["result_email"] = email
-        session.pop("verified_email", None)
-        session.pop("verified_token", None)
-    elif result["state"] == "failed":
-        update_user_status(email, "FAILED")
-        log_verification_event(
-            email=email,
-            status="FAILED",
-            reason=result.get("message", ""),
-            open_captured=result.get("open_captured", False),
-            closed_captured=result.get("closed_captured", False),
-            open_capture_ref=result.get("open_capture_ref", ""),
-            closed_capture_ref=result.get("closed_capture_ref", ""),
-        )
-        session["result_email"] = email
-        session.pop("verified_email", None)
-        session.pop("verified_token", None)
+    if result.get("busy"):
+        response = jsonify(result)
+        response.status_code = 429
+        response.headers["Retry-After"] = str(max(1, math.ceil(result["next_frame_in_ms"] / 1000.0)))
+        return response
+
+    if result["state"] in {"verified", "failed"}:
+        if not result.pop("recorded", False):
+            _record_outcome(email, result["state"].upper(), result.get("message", ""), result, token)
+        _close_verification_session(email)
 
     return jsonify(result)
 
 
+def _finished_result(user):
+    # The token's check already ended (its session tombstone may be gone), so
+    # a late frame must not start a new one.
+    return {
+        "state": user["status"].lower(),
+        "message": "Verification session already completed.",
+    }
+
+
+def _record_outcome(email, status, reason, result, token=""):
+    # The capture images are not JSON; they go to the persister, which fills
+    # the event's capture refs once the files are written and uploaded.
+    images = result.pop("capture_images", None)
+    app = current_app._get_current_object()
+    started = time.perf_counter()
+    pending_event = outcome_writer.submit(
+        app,
+        email=email,
+        status=status,
+        reason=reason,
+        open_captured=result.get("open_captured", False),
+        closed_captured=result.get("closed_captured", False),
+    )
+    # Wait for the (possibly batched) commit: /result reads the status back.
+    event_id = pending_event.result()
+    observe_stage("outcome_write", (time.perf_counter() - started) * 1000.0)
+    capture_persister.submit(app, event_id, email, token, images)
+
+
+def _close_verification_session(email):
+    session["result_email"] = email
+    session.pop("verified_email", None)
+    session.pop("verified_token", None)
+
+
+def _receive_latest_frame(ws, idle_timeout, stream_state):
+    # Text messages carry the FrameRegion of the binary frame that follows them.
+    # Frames that queued up while the previous one was being analyzed are stale;
+    # keep only the newest instead of letting the backlog grow.
+    frame = None
+    frame_region = None
+    message = ws.receive(timeout=idle_timeout)
+    while message is not None:
+        if isinstance(message, str):
+            try:
+                payload = json.loads(message)
+            except ValueError:
+                payload = {}
+            if isinstance(payload, dict) and "region" in payload:
+                stream_state["region"] = FrameRegion.parse(payload.get("region") or "")
+        else:
+            frame = message
+            frame_region = stream_state.pop("region", None)
+        message = ws.receive(timeout=0 if frame is not None else idle_timeout)
+    return frame, frame_region
+
+
+def liveness_stream(ws):
+    if not current_app.config.get("LIVENESS_STREAM_ENABLED", False):
+        ws.send(json.dumps({"state": "unavailable", "message": "Streaming is disabled."}))
+        return
+
+    email = session.get("verified_email")
+    token = session.get("verified_token")
+    if not email or not token:
+        # Same fallback as /process_frame when the session cookie is missing:
+        # the first text message carries the verification identity.
+        hello = ws.receive(timeout=STREAM_IDLE_TIMEOUT_SECONDS)
+        try:
+            payload = json.loads(hello) if isinstance(hello, str) else {}
+        except ValueError:
+            payload = {}
+        email = (payload.get("email") or "").strip().lower()
+        token = (payload.get("token") or "").strip()
+
+    user = get_user_by_email_and_token_cached(email, token) if email and token else None
+    if not user:
+        ws.send(json.dumps({"state": "failed", "message": "Invalid verification token."}))
+        return
+    if user["status"] != "PENDING":
+        ws.send(json.dumps(_finished_result(user)))
+        return
+
+    ws.send(json.dumps({"state": "ready", "message": "Stream connected."}))
+    stream_state = {}
+    while True:
+        frame, region = _receive_latest_frame(ws, STREAM_IDLE_TIMEOUT_SECONDS, stream_state)
+        if frame is None:
+            return
+
+        try:
+            result = liveness_manager.process_frame(
+                email=email,
+                token=token,
+                image_data=frame,
+                region=region,
+            )
+        except Exception as exc:
+            current_app.logger.exception("Streamed frame processing failed unexpectedly: %s", exc)
+            _record_outcome(email, "FAILED", "internal_processing_error", {})
+            ws.send(json.dumps({"state": "failed", "message": "Internal processing error."}))
+            return
+
+        if result["state"] in {"verified", "failed"}:
+            if not result.pop("recorded", False):
+                _record_outcome(email, result["state"].upper(), result.get("message", ""), result, token)
+            ws.send(json.dumps(result))
+            return
+        ws.send(json.dumps(result))
+
+
+if sock is not None:
+    sock.route("/ws/liveness", bp=camera_bp)(liveness_stream)
+
+
 @camera_bp.route("/result")
 def result_page():
     email = session.get("result_email")
     status = request.args.get("status", "").strip().upper()
 
+    if not email and session.get("verified_email"):
+        # Streamed checks finish on the WebSocket, where the cookie cannot be
+        # rewritten, so the verification session is closed on the next page load.
+        user = get_user_by_email(session["verified_email"])
+        if user and user["status"] in {"VERIFIED", "FAILED"}:
+            email = user["email"]
+            _close_verification_session(email)
+
     if email:
         user = get_user_by_email(email)
         if user:
@@ -144,67 +293,281 @@ def result_page():
     return render_template("result.html", status=status, email=email)
 
 
-@camera_bp.route("/admin/events", methods=["GET"])
-def admin_events():
+def _admin_auth_error():
     configured_key = current_app.config.get("ADMIN_API_KEY", "")
     if not configured_key:
         return jsonify({"error": "Admin API key is not configured."}), 403
 
+    authorization = request.headers.get("Authorization", "")
+    bearer_key = authorization[7:].strip() if authorization.startswith("Bearer ") else ""
     provided_key = (
         request.headers.get("X-Admin-Key", "").strip()
+        or bearer_key
         or request.args.get("key", "").strip()
     )
     if not provided_key or not hmac.compare_digest(provided_key, configured_key):
         return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def _event_filters_from_request():
+    # Shared by the paginated listing and the streaming exports. Raises
+    # ValueError for a malformed status or timestamp.
+    filters = {
+        "status": request.args.get("status", "").strip() or None,
+        "email": request.args.get("email", "").strip() or None,
+        "created_from": request.args.get("from", "").strip() or None,
+        "created_to": request.args.get("to", "").strip() or None,
+    }
+    if filters["status"] and filters["status"].upper() not in VALID_STATUSES:
+        raise ValueError("Invalid status filter.")
+    for name in ("created_from", "created_to"):
+        if filters[name]:
+            filters[name] = normalize_event_timestamp(filters[name])
+    return filters
+
+
+def _stream_events_csv(rows):
+    # One small buffer reused per row so memory stays flat for any export size.
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EVENT_EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
 
-    limit = request.args.get("limit", "100")
+
+def _stream_events_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+@camera_bp.route("/admin/events", methods=["GET"])
+def admin_events():
+    auth_error = _admin_auth_error()
+    if auth_error:
+        return auth_error
+
+    try:
+        limit = int(request.args.get("limit", "100"))
+    except ValueError:
+        limit = 100
     try:
-        rows = get_recent_verification_events(limit=int(limit))
+        before_id = request.args.get("before_id", "").strip()
+        before_id = int(before_id) if before_id else None
+        filters = _event_filters_from_request()
     except ValueError:
-        rows = get_recent_verification_events(limit=100)
+        return jsonify({"error": "Invalid before_id, status or time range."}), 400
 
-    return jsonify({"count": len(rows), "events": rows}), 200
+    rows = get_verification_events_page(limit=limit, before_id=before_id, **filters)
+    next_before_id = rows[-1]["id"] if len(rows) >= max(1, min(limit, 500)) else None
+    return jsonify({"count": len(rows), "events": rows, "next_before_id": next_before_id}), 200
 
 
 @camera_bp.route("/admin/events.csv", methods=["GET"])
 def admin_events_csv():
-    configured_key = current_app.config.get("ADMIN_API_KEY", "")
-    if not configured_key:
-        return jsonify({"error": "Admin API key is not configured."}), 403
-
-    provided_key = (
-        request.headers.get("X-Admin-Key", "").strip()
-        or request.args.get("key", "").strip()
-    )
-    if not provided_key or not hmac.compare_digest(provided_key, configured_key):
-        return jsonify({"error": "Unauthorized"}), 401
+    auth_error = _admin_auth_error()
+    if auth_error:
+        return auth_error
 
-    limit = request.args.get("limit", "500")
     try:
-        rows = get_recent_verification_events(limit=int(limit))
+        rows = iter_verification_events(**_event_filters_from_request())
     except ValueError:
-        rows = get_recent_verification_events(limit=500)
-
-    output = io.StringIO()
-    writer = csv.DictWriter(
-        output,
-        fieldnames=[
-            "id",
-            "email",
-            "status",
-            "reason",
-            "open_captured",
-            "closed_captured",
-            "open_capture_ref",
-            "closed_capture_ref",
-            "created_at",
-        ],
-    )
-    writer.writeheader()
-    writer.writerows(rows)
+        return jsonify({"error": "Invalid status or time range."}), 400
 
     return Response(
-        output.getvalue(),
+        _stream_events_csv(rows),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment; filename=verification_events.csv"},
     )
+
+
+@camera_bp.route("/admin/events.ndjson", methods=["GET"])
+def admin_events_ndjson():
+    auth_error = _admin_auth_error()
+    if auth_error:
+        return auth_error
+
+    try:
+        rows = iter_verification_events(**_event_filters_from_request())
+    except ValueError:
+        return jsonify({"error": "Invalid status or time range."}), 400
+
+    return Response(
+        _stream_events_ndjson(rows),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=verification_events.ndjson"},
+    )
+
+
+_STATS_DEFAULT_WINDOWS = {"minute": timedelta(minutes=60), "hour": timedelta(hours=24)}
+
+
+def _empty_stats():
+    return {
+        "events": 0,
+        "by_status": {},
+        "failure_reasons": {},
+        "open_captured": 0,
+        "closed_captured": 0,
+        "both_captured": 0,
+    }
+
+
+def _add_rollup(stats, row):
+    stats["events"] += row["events"]
+    stats["by_status"][row["status"]] = stats["by_status"].get(row["status"], 0) + row["events"]
+    if row["status"] == "FAILED":
+        reason = row["reason"] or "unspecified"
+        stats["failure_reasons"][reason] = stats["failure_reasons"].get(reason, 0) + row["events"]
+    for name in ("open_captured", "closed_captured", "both_captured"):
+        stats[name] += row[name]
+
+
+def _finish_stats(stats):
+    events = stats["events"]
+    for name in ("open_captured", "closed_captured", "both_captured"):
+        stats[name + "_ratio"] = round(stats[name] / events, 4) if events else 0.0
+    stats["pass_rate"] = round(stats["by_status"].get("VERIFIED", 0) / events, 4) if events else 0.0
+    return stats
+
+
+@camera_bp.route("/admin/stats", methods=["GET"])
+def admin_stats():
+    auth_error = _admin_auth_error()
+    if auth_error:
+        return auth_error
+
+    granularity = request.args.get("granularity", "minute").strip().lower()
+    if granularity not in ROLLUP_GRANULARITIES:
+        return jsonify({"error": "granularity must be minute or hour."}), 400
+
+    now = datetime.now(timezone.utc)
+    try:
+        created_from = normalize_event_timestamp(
+            request.args.get("from", "").strip()
+            or (now - _STATS_DEFAULT_WINDOWS[granularity]).isoformat()
+        )
+        created_to = normalize_event_timestamp(request.args.get("to", "").strip() or now.isoformat())
+    except ValueError:
+        return jsonify({"error": "Invalid time range."}), 400
+
+    prefix_length = ROLLUP_GRANULARITIES[granularity]
+    rows = get_verification_event_rollups(
+        granularity,
+        created_from[:prefix_length],
+        created_to[:prefix_length],
+    )
+
+    totals = _empty_stats()
+    buckets = {}
+    for row in rows:
+        _add_rollup(totals, row)
+        _add_rollup(buckets.setdefault(row["bucket"], _empty_stats()), row)
+
+    return jsonify(
+        {
+            "granularity": granularity,
+            "from": created_from,
+            "to": created_to,
+            "totals": _finish_stats(totals),
+            "buckets": [
+                dict(_finish_stats(stats), bucket=bucket) for bucket, stats in buckets.items()
+            ],
+        }
+    ), 200
+
+
+def _collect_runtime_metrics():
+    # Read at scrape time from state the request path keeps anyway.
+    admission = liveness_manager.admission.stats()
+    token_cache = get_token_cache_stats()
+    pool = liveness_manager.detector_pool
+    affinity_results = ("affinity_hit", "assigned", "reassigned")
+    affinity = pool.stats() if pool is not None else dict.fromkeys(affinity_results, 0)
+    return [
+        (
+            "liveness_active_sessions",
+            "gauge",
+            "Liveness sessions admitted in this process and not yet finished.",
+            [({}, admission["active_sessions"])],
+        ),
+        (
+            "liveness_frames_in_flight",
+            "gauge",
+            "Frames currently being processed in this process.",
+            [({}, admission["in_flight"])],
+        ),
+        (
+            "liveness_admission_total",
+            "counter",
+            "Admission decisions for incoming frames.",
+            [
+                ({"result": name}, admission[name])
+                for name in ("admitted", "session_busy", "overloaded", "at_capacity")
+            ],
+        ),
+        (
+            "liveness_detector_pool_load",
+            "gauge",
+            "Detectors busy or awaited, relative to the pool size.",
+            [({}, pool.load() if pool is not None else 0.0)],
+        ),
+        (
+            "liveness_detector_affinity_total",
+            "counter",
+            "Detector checkouts by whether the session got its own, a free or another's detector.",
+            [
+                ({"result": name}, affinity[name])
+                for name in affinity_results
+            ],
+        ),
+        (
+            "liveness_inference_seconds_ewma",
+            "gauge",
+            "Smoothed detector inference time.",
+            [({}, liveness_manager.inference_ms / 1000.0)],
+        ),
+        (
+            "liveness_reaper_pending",
+            "gauge",
+            "Sessions waiting for their expiry deadline.",
+            [({}, liveness_manager.reaper.pending())],
+        ),
+        (
+            "token_cache_lookups_total",
+            "counter",
+            "Verification token cache lookups.",
+            [({"result": "hit"}, token_cache["hits"]), ({"result": "miss"}, token_cache["misses"])],
+        ),
+        (
+            "token_cache_entries",
+            "gauge",
+            "Entries in the verification token cache.",
+            [({}, token_cache["size"])],
+        ),
+    ]
+
+
+registry.register_collector(_collect_runtime_metrics)
+
+
+@camera_bp.route("/metrics", methods=["GET"])
+def metrics():
+    auth_error = _admin_auth_error()
+    if auth_error:
+        return auth_error
+
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@camera_bp.route("/admin/token-cache", methods=["GET"])
+def admin_token_cache():
+    auth_error = _admin_auth_error()
+    if auth_error:
+        return auth_error
+
+    return jsonify(get_token_cache_stats()), 200
@@ -0,0 +1,86 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scripts.replay_benchmark import load_frames  # noqa: E402
+from services.eye_detection import create_eye_detector  # noqa: E402
+from utils.image_utils import decode_image_bytes  # noqa: E402
+
+
+WARMUP_FRAMES = 3
+
+
+def run(kind, frames, face_padding):
+    detector = create_eye_detector(kind, face_padding)
+    for frame in frames[:WARMUP_FRAMES]:
+        detector.analyze(frame)
+
+    # A fresh detector per kind, replayed in order, so tracking behaves as in
+    # a live session.
+    detector = create_eye_detector(kind, face_padding)
+    results = []
+    durations = []
+    for frame in frames:
+        started = time.perf_counter()
+        results.append(detector.analyze(frame))
+        durations.append((time.perf_counter() - started) * 1000.0)
+    return results, np.array(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the full-frame Face Mesh detector with the face-detector cascade "
+            "on recorded frames: per-frame time and EAR / eye-state agreement."
+        )
+    )
+    parser.add_argument("source", help="Directory of images or a video file.")
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--face-padding", type=float, default=0.25)
+    args = parser.parse_args()
+
+    frames = [decode_image_bytes(data) for data in load_frames(args.source, args.max_frames)]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        parser.error(f"no frames could be read from {args.source}")
+
+    try:
+        baseline, baseline_ms = run("face_mesh", frames, args.face_padding)
+        cascade, cascade_ms = run("cascade", frames, args.face_padding)
+    except (ImportError, RuntimeError) as exc:
+        print(f"MediaPipe is required for this benchmark: {exc}", file=sys.stderr)
+        return 1
+
+    print(f"{len(frames)} frames")
+    for label, durations in (("face_mesh", baseline_ms), ("cascade", cascade_ms)):
+        p50, p95 = np.percentile(durations, [50, 95])
+        print(f"{label:<10} mean {durations.mean():7.2f} ms  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+    print(f"speedup    {baseline_ms.mean() / cascade_ms.mean():.2f}x")
+
+    same_count = sum(a["face_count"] == b["face_count"] for a, b in zip(baseline, cascade))
+    same_state = sum(a["eye_state"] == b["eye_state"] for a, b in zip(baseline, cascade))
+    skipped = sum(b["face_count"] == 1 and b["ear"] is None for b in cascade)
+    ear_pairs = [
+        (a["ear"], b["ear"])
+        for a, b in zip(baseline, cascade)
+        if a["ear"] is not None and b["ear"] is not None
+    ]
+    print(f"face count agreement {same_count}/{len(frames)}")
+    print(f"eye state agreement  {same_state}/{len(frames)}")
+    print(f"cascade skipped mesh on {skipped} misaligned frames")
+    if ear_pairs:
+        differences = np.abs(np.subtract(*np.array(ear_pairs).T))
+        print(
+            f"EAR |difference| over {len(ear_pairs)} frames: mean {differences.mean():.4f}  "
+            f"p95 {np.percentile(differences, 95):.4f}  max {differences.max():.4f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
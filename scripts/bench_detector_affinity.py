@@ -0,0 +1,135 @@
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.detector_pool import DetectorPool  # noqa: E402
+
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+class FakeTrackingDetector:
+    # Models FaceMesh in tracking mode: a frame of the face seen last costs
+    # --track-ms, any other face pays full detection (--detect-ms). The
+    # session id is stamped into the first pixel of its synthetic frames.
+    def __init__(self, detect_ms, track_ms):
+        self.detect_ms = detect_ms
+        self.track_ms = track_ms
+        self.last_face = None
+
+    def analyze(self, frame_bgr):
+        face = int(frame_bgr[0, 0, 0])
+        time.sleep((self.track_ms if face == self.last_face else self.detect_ms) / 1000.0)
+        self.last_face = face
+        return {"face_count": 1}
+
+
+def synthetic_sessions(sessions, frames, width, height):
+    rng = np.random.default_rng(3)
+    recordings = []
+    for session_index in range(sessions):
+        base = (rng.random((height, width, 3)) * 255).astype(np.uint8)
+        base[0, 0, 0] = session_index % 256
+        recordings.append([base] * frames)
+    return recordings
+
+
+def recorded_sessions(directories, frames):
+    # One directory of frames per person; each becomes one session.
+    recordings = []
+    for directory in directories:
+        files = sorted(
+            item for item in Path(directory).iterdir() if item.suffix.lower() in IMAGE_SUFFIXES
+        )
+        decoded = [cv2.imread(str(item)) for item in files[: frames or None]]
+        recordings.append([frame for frame in decoded if frame is not None])
+    return recordings
+
+
+def run(recordings, factory, pool_size, affinity, interval_ms):
+    # Frames arrive interleaved across sessions, the way concurrent users'
+    # uploads reach the server: one frame in flight per session, each client
+    # pacing its next upload with some jitter.
+    pool = DetectorPool(factory, pool_size)
+    durations = []
+    lock = threading.Lock()
+
+    def replay(session_index):
+        key = f"session-{session_index}" if affinity else None
+        rng = np.random.default_rng(session_index)
+        for frame in recordings[session_index]:
+            time.sleep(interval_ms * rng.uniform(0.5, 1.5) / 1000.0)
+            with pool.acquire(key) as detector:
+                started = time.perf_counter()
+                detector.analyze(frame)
+                elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                durations.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(recordings)) as executor:
+        list(executor.map(replay, range(len(recordings))))
+    wall = time.perf_counter() - started
+    return np.array(durations), wall, pool.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare per-frame inference time with a shared detector pool against "
+            "per-session detector affinity."
+        )
+    )
+    parser.add_argument(
+        "recordings",
+        nargs="*",
+        help="One directory of frames per session. Without any, --fake is required.",
+    )
+    parser.add_argument("--fake", action="store_true", help="Simulate tracking with FakeTrackingDetector.")
+    parser.add_argument("--detect-ms", type=float, default=30.0)
+    parser.add_argument("--track-ms", type=float, default=8.0)
+    parser.add_argument("--sessions", type=int, default=4, help="Synthetic sessions with --fake.")
+    parser.add_argument("--frames", type=int, default=40, help="Frames per session.")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--interval-ms", type=float, default=40.0, help="Mean client frame interval.")
+    args = parser.parse_args()
+
+    if args.fake:
+        recordings = synthetic_sessions(args.sessions, args.frames, 640, 360)
+        factory = lambda: FakeTrackingDetector(args.detect_ms, args.track_ms)  # noqa: E731
+    elif args.recordings:
+        from services.eye_detection import EyeDetector
+
+        recordings = recorded_sessions(args.recordings, args.frames)
+        factory = EyeDetector
+    else:
+        parser.error("pass recording directories or --fake")
+
+    print(
+        f"{len(recordings)} sessions x {max(len(frames) for frames in recordings)} frames, "
+        f"pool size {args.pool_size}"
+    )
+    results = {}
+    for label, affinity in (("shared", False), ("affinity", True)):
+        durations, wall, stats = run(recordings, factory, args.pool_size, affinity, args.interval_ms)
+        results[label] = durations.mean()
+        p50, p95 = np.percentile(durations, [50, 95])
+        print(
+            f"{label:<9} mean {durations.mean():7.2f} ms  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+            f"wall {wall:6.2f}s  hits {stats['affinity_hit']} reassigned {stats['reassigned']}"
+        )
+    gain = (1 - results["affinity"] / results["shared"]) * 100
+    print(f"per-frame inference {gain:.0f}% faster with affinity")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
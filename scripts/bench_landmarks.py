@@ -0,0 +1,124 @@
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.eye_detection import (  # noqa: E402
+    EyeDetector,
+    LEFT_EYE_INDICES,
+    RIGHT_EYE_INDICES,
+)
+from services.face_detection import FaceBox, extract_face_box, landmarks_to_array  # noqa: E402
+
+
+try:
+    from mediapipe.framework.formats import landmark_pb2
+except Exception:
+    landmark_pb2 = None
+
+
+FACE_MESH_LANDMARKS = 478
+FRAME_SHAPE = (720, 1280, 3)
+
+
+def build_landmarks(seed, use_protobuf):
+    # FaceMesh hands back NormalizedLandmarkList protos; plain objects are used
+    # when MediaPipe is not installed (that exercises the attribute fallback).
+    rng = np.random.default_rng(seed)
+    coordinates = rng.uniform(0.3, 0.7, size=(FACE_MESH_LANDMARKS, 3))
+    coordinates[:, 2] -= 0.5
+    if not use_protobuf:
+        return SimpleNamespace(
+            landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in coordinates.tolist()]
+        )
+
+    face_landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in coordinates.tolist():
+        point = face_landmarks.landmark.add()
+        point.x = x
+        point.y = y
+        point.z = z
+    return face_landmarks
+
+
+def legacy_ear(face_landmarks, indices, frame_width, frame_height):
+    points = [
+        (face_landmarks.landmark[index].x * frame_width, face_landmarks.landmark[index].y * frame_height)
+        for index in indices
+    ]
+    horizontal = math.dist(points[0], points[3])
+    if horizontal == 0:
+        return 0.0
+    vertical = math.dist(points[1], points[5]) + math.dist(points[2], points[4])
+    return vertical / (2.0 * horizontal)
+
+
+def legacy_frame(face_landmarks, frame_shape):
+    frame_height, frame_width = frame_shape[:2]
+    left_ear = legacy_ear(face_landmarks, LEFT_EYE_INDICES, frame_width, frame_height)
+    right_ear = legacy_ear(face_landmarks, RIGHT_EYE_INDICES, frame_width, frame_height)
+
+    x_points = [point.x * frame_width for point in face_landmarks.landmark]
+    y_points = [point.y * frame_height for point in face_landmarks.landmark]
+    min_x = max(0, int(min(x_points)))
+    max_x = min(frame_width - 1, int(max(x_points)))
+    min_y = max(0, int(min(y_points)))
+    max_y = min(frame_height - 1, int(max(y_points)))
+    face_box = FaceBox(min_x, min_y, max(1, max_x - min_x), max(1, max_y - min_y))
+    return (left_ear + right_ear) / 2.0, face_box
+
+
+def vectorized_frame(face_landmarks, frame_shape):
+    points = landmarks_to_array(face_landmarks, frame_shape)
+    avg_ear = float(EyeDetector._compute_ears(points).mean())
+    return avg_ear, extract_face_box(points, frame_shape)
+
+
+def measure(label, func, samples, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for face_landmarks in samples:
+            func(face_landmarks, FRAME_SHAPE)
+    elapsed = time.perf_counter() - start
+    per_frame_us = elapsed / (iterations * len(samples)) * 1e6
+    print(f"{label:<12} {per_frame_us:8.1f} us/frame")
+    return per_frame_us
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare per-frame landmark geometry cost (EAR + face box)."
+    )
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument(
+        "--plain",
+        action="store_true",
+        help="Use plain Python objects even when MediaPipe protobufs are available.",
+    )
+    args = parser.parse_args()
+
+    use_protobuf = landmark_pb2 is not None and not args.plain
+    print(f"landmarks    {'protobuf' if use_protobuf else 'plain objects'}")
+    samples = [build_landmarks(seed, use_protobuf) for seed in range(args.frames)]
+    for face_landmarks in samples:
+        legacy_ear_value, legacy_box = legacy_frame(face_landmarks, FRAME_SHAPE)
+        ear_value, face_box = vectorized_frame(face_landmarks, FRAME_SHAPE)
+        if not math.isclose(legacy_ear_value, ear_value, rel_tol=1e-9) or legacy_box != face_box:
+            print("[FAIL] Vectorized geometry does not match the legacy path.")
+            return 1
+
+    legacy_us = measure("legacy", legacy_frame, samples, args.iterations)
+    vectorized_us = measure("vectorized", vectorized_frame, samples, args.iterations)
+    print(f"speedup      {legacy_us / vectorized_us:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
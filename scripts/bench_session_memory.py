@@ -0,0 +1,80 @@
+import argparse
+import secrets
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.liveness_check import LivenessManager, LivenessSession  # noqa: E402
+
+
+@dataclass
+class LegacyEyeFrameCapture:
+    captured: bool = False
+    score: float = -1.0
+    image: bytes = b""
+
+
+class LegacyLivenessSession:
+    def __init__(self):
+        self.started_at = time.time()
+        self.open_eye = LegacyEyeFrameCapture()
+        self.closed_eye = LegacyEyeFrameCapture()
+        self.saw_open_before_close = False
+        self.saw_closed_after_open = False
+        self.saw_reopen_after_close = False
+        self.closed = False
+
+
+def legacy_session_key(email, token):
+    return f"{email.lower()}::{token}"
+
+
+def advance(session):
+    # Mid-blink state with both captures scored, like a typical live session.
+    session.saw_open_before_close = True
+    session.saw_closed_after_open = True
+    session.open_eye.captured = True
+    session.open_eye.score = 123.456
+    session.closed_eye.captured = True
+    session.closed_eye.score = 98.765
+
+
+def measure(label, identities, session_cls, key_func):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = {}
+    for email, token in identities:
+        session = session_cls()
+        advance(session)
+        sessions[key_func(email, token)] = session
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    per_session = used / float(len(identities))
+    print(f"{label:<8} {per_session:8.0f} bytes/session")
+    return per_session
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the in-memory footprint of liveness sessions and their keys."
+    )
+    parser.add_argument("--sessions", type=int, default=50000)
+    args = parser.parse_args()
+
+    identities = [
+        (f"user{index}@example.com", secrets.token_urlsafe(32))
+        for index in range(args.sessions)
+    ]
+    before = measure("legacy", identities, LegacyLivenessSession, legacy_session_key)
+    after = measure("compact", identities, LivenessSession, LivenessManager._session_key)
+    print(f"saved    {before - after:8.0f} bytes/session ({(1 - after / before) * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import argparse
+import atexit
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from flask import Flask  # noqa: E402
+
+from config import Config  # noqa: E402
+from models.user import init_db  # noqa: E402
+from services.eye_detection import (  # noqa: E402
+    EYE_DETECTOR_BACKENDS,
+    DetectorBackend,
+    create_eye_detector,
+)
+from services.face_detection import extract_face_box  # noqa: E402
+from services.liveness_check import LivenessManager  # noqa: E402
+from utils.image_utils import decode_image_bytes  # noqa: E402
+
+
+FACE_MESH_LANDMARKS = 478
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+STAGES = (
+    "decode",
+    "prefilter",
+    "detector_wait",
+    "analyze",
+    "alignment",
+    "sharpness",
+    "capture",
+    "total",
+)
+# EAR the fake detector reports for each character of --blink-pattern.
+FAKE_EARS = {"O": 0.30, "C": 0.10, "U": 0.215}
+CALIBRATION_WARMUP_FRAMES = 3
+
+# The replay worker tells the fake detector which pattern step it is on; the
+# detector runs on the worker's own thread with the thread inference backend.
+_REPLAY = threading.local()
+
+
+class FakeLandmarkDetector(DetectorBackend):
+    # Stands in for FaceMesh: one centered face whose eye landmarks open and
+    # close per --blink-pattern. The EAR, eye state and face box still go
+    # through DetectorBackend's own array code.
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.templates = {}
+
+    def _template(self, frame_shape):
+        template = self.templates.get(frame_shape[:2])
+        if template is not None:
+            return template
+
+        frame_height, frame_width = frame_shape[:2]
+        rng = np.random.default_rng(0)
+        points = np.zeros((FACE_MESH_LANDMARKS, 3))
+        points[:, 0] = rng.uniform(0.35, 0.65, FACE_MESH_LANDMARKS) * frame_width
+        points[:, 1] = rng.uniform(0.2, 0.8, FACE_MESH_LANDMARKS) * frame_height
+        template = (points, frame_width * 0.06, frame_height * 0.4)
+        self.templates[frame_shape[:2]] = template
+        return template
+
+    def analyze(self, frame_bgr, region=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        template, eye_width, eye_y = self._template(frame_bgr.shape)
+        points = template.copy()
+        half_open = FAKE_EARS[getattr(_REPLAY, "eye", "O")] * eye_width / 2.0
+        frame_width = frame_bgr.shape[1]
+        for (corner, top_a, top_b, corner_end, bottom_b, bottom_a), center_x in (
+            ((33, 160, 158, 133, 153, 144), frame_width * 0.43),
+            ((362, 385, 387, 263, 373, 380), frame_width * 0.57),
+        ):
+            points[corner, :2] = (center_x - eye_width / 2.0, eye_y)
+            points[corner_end, :2] = (center_x + eye_width / 2.0, eye_y)
+            for top, bottom, offset in ((top_a, bottom_a, -0.2), (top_b, bottom_b, 0.2)):
+                points[top, :2] = (center_x + offset * eye_width, eye_y - half_open)
+                points[bottom, :2] = (center_x + offset * eye_width, eye_y + half_open)
+
+        avg_ear = float(self._compute_ears(points).mean())
+        return {
+            "face_count": 1,
+            "face_landmarks": points,
+            "face_box": extract_face_box(points, frame_bgr.shape),
+            "ear": avg_ear,
+            "eye_state": self._classify_eye_state(avg_ear),
+        }
+
+
+def load_frames(source, max_frames):
+    path = Path(source)
+    if path.is_dir():
+        files = sorted(item for item in path.iterdir() if item.suffix.lower() in IMAGE_SUFFIXES)
+        return [item.read_bytes() for item in files[: max_frames or None]]
+
+    capture = cv2.VideoCapture(str(path))
+    frames = []
+    try:
+        while not max_frames or len(frames) < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            # Same encoding the browser client uploads.
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if ok:
+                frames.append(encoded.tobytes())
+    finally:
+        capture.release()
+    return frames
+
+
+def synthetic_frames(count, width, height):
+    # Smooth shapes plus mild grain, roughly camera-like: passes the prefilter
+    # and sharpness gates, encodes to a realistic JPEG size, and no two frames
+    # are near-duplicates.
+    rng = np.random.default_rng(1)
+    frames = []
+    for _ in range(count):
+        base = rng.random((height // 16, width // 16, 3)) * 255
+        frame = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC)
+        frame += rng.normal(0.0, 12.0, frame.shape)
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+    return frames
+
+
+def measure_backend(kind, frames, config):
+    # Mean analyze() time of a fresh detector over decoded frames, after a
+    # short warm-up. Returns (None, reason) when the backend cannot load here.
+    try:
+        detector = create_eye_detector(
+            kind,
+            config["CASCADE_FACE_PADDING"],
+            config["FACE_LANDMARKER_MODEL_PATH"],
+        )
+    except (ImportError, RuntimeError) as exc:
+        return None, str(exc)
+
+    for frame in frames[:CALIBRATION_WARMUP_FRAMES]:
+        detector.analyze(frame)
+    durations = []
+    for frame in frames:
+        started = time.perf_counter()
+        detector.analyze(frame)
+        durations.append((time.perf_counter() - started) * 1000.0)
+    return float(np.mean(durations)), None
+
+
+def pick_backend(frames, config, calibration_frames):
+    # Every backend runs MediaPipe on the CPU, so their relative cost depends
+    # on this box's cores and instruction set; measure rather than assume.
+    decoded = [decode_image_bytes(data) for data in frames[:calibration_frames]]
+    decoded = [frame for frame in decoded if frame is not None]
+    if not decoded:
+        return None
+
+    latencies = {}
+    print(f"calibrating on {len(decoded)} frames")
+    for kind in EYE_DETECTOR_BACKENDS:
+        mean_ms, error = measure_backend(kind, decoded, config)
+        if mean_ms is None:
+            print(f"  {kind:<16} unavailable: {error}")
+            continue
+        latencies[kind] = mean_ms
+        print(f"  {kind:<16} {mean_ms:8.2f} ms/frame")
+    if not latencies:
+        return None
+    return min(latencies, key=latencies.get)
+
+
+class StageTimings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def __call__(self, stage, elapsed_ms):
+        with self.lock:
+            self.samples[stage].append(elapsed_ms)
+
+    def report(self):
+        print(f"{'stage':<14} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage in STAGES:
+            values = self.samples.get(stage)
+            if not values:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            print(f"{stage:<14} {len(values):>7} {p50:>9.3f} {p95:>9.3f} {p99:>9.3f}")
+
+
+def replay_session(app, manager, timings, frames, index, args):
+    email = f"replay{index}@example.com"
+    token = f"replay-token-{index}"
+    with app.app_context():
+        for step in range(args.frames_per_session or len(frames)):
+            _REPLAY.eye = args.blink_pattern[step % len(args.blink_pattern)]
+            started = time.perf_counter()
+            result = manager.process_frame(email, token, frames[step % len(frames)])
+            timings("total", (time.perf_counter() - started) * 1000.0)
+            if result.get("busy"):
+                return "shed", step + 1
+            if result["state"] in {"verified", "failed"}:
+                return result["state"], step + 1
+            if args.pace:
+                time.sleep(result.get("next_frame_in_ms", app.config["FRAME_CAPTURE_INTERVAL_MS"]) / 1000.0)
+    return "incomplete", step + 1
+
+
+def build_app(args):
+    app = Flask("replay_benchmark")
+    app.config.from_object(Config)
+    # Measure the pipeline, not the load shedder.
+    app.config["MAX_IN_FLIGHT_FRAMES"] = 0
+    app.config["MAX_ACTIVE_SESSIONS"] = 0
+    app.config["LIVENESS_SESSION_STORE"] = "memory"
+    # The reaper logs sessions that outlive LIVENESS_TIMEOUT_SECONDS as FAILED;
+    # keep those synthetic outcomes out of the real database.
+    database_dir = tempfile.mkdtemp(prefix="replay_benchmark_")
+    atexit.register(shutil.rmtree, database_dir, True)
+    app.config["DATABASE_URL"] = f"sqlite:///{Path(database_dir) / 'replay.db'}"
+    if args.pool_size:
+        app.config["DETECTOR_POOL_SIZE"] = args.pool_size
+    if args.landmarker_model:
+        app.config["FACE_LANDMARKER_MODEL_PATH"] = args.landmarker_model
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Replay recorded frames through LivenessManager.process_frame and report "
+            "per-stage latency, throughput and verification outcomes."
+        )
+    )
+    parser.add_argument("source", nargs="?", help="Directory of images or a video file.")
+    parser.add_argument("--fake-detector", action="store_true", help="Use fake landmarks instead of MediaPipe.")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0, help="Simulated inference time per frame.")
+    parser.add_argument("--blink-pattern", default="OOOCCOOO", help="Fake eye state per frame: O, C or U.")
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=0, help="Override DETECTOR_POOL_SIZE.")
+    parser.add_argument("--frames-per-session", type=int, default=0, help="Default: one pass over the frames.")
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--pace", action="store_true", help="Sleep for next_frame_in_ms between frames.")
+    parser.add_argument(
+        "--backend",
+        choices=("configured",) + EYE_DETECTOR_BACKENDS + ("auto",),
+        default="configured",
+        help="Eye detector backend; auto times each one on the first frames and replays with the fastest.",
+    )
+    parser.add_argument("--calibration-frames", type=int, default=30)
+    parser.add_argument("--landmarker-model", help="Override FACE_LANDMARKER_MODEL_PATH.")
+    args = parser.parse_args()
+
+    if args.source:
+        frames = load_frames(args.source, args.max_frames)
+    elif args.fake_detector:
+        frames = synthetic_frames(args.max_frames or 24, 960, 540)
+    else:
+        parser.error("a frame source is required unless --fake-detector is set")
+    if not frames:
+        parser.error(f"no frames could be read from {args.source}")
+    if not set(args.blink_pattern) <= set(FAKE_EARS):
+        parser.error("--blink-pattern may only contain O, C and U")
+    if args.fake_detector and args.backend != "configured":
+        parser.error("--backend selects a MediaPipe detector and cannot be combined with --fake-detector")
+
+    app = build_app(args)
+    if args.backend == "auto":
+        backend = pick_backend(frames, app.config, args.calibration_frames)
+        if backend is None:
+            print("No eye detector backend could run on these frames.", file=sys.stderr)
+            return 1
+        print(f"selected {backend} (set EYE_DETECTOR_BACKEND={backend} to deploy it)")
+        app.config["EYE_DETECTOR_BACKEND"] = backend
+    elif args.backend != "configured":
+        app.config["EYE_DETECTOR_BACKEND"] = args.backend
+    timings = StageTimings()
+    factory = None
+    if args.fake_detector:
+        factory = lambda: FakeLandmarkDetector(args.fake_latency_ms)  # noqa: E731
+    manager = LivenessManager(detector_factory=factory, stage_observer=timings)
+
+    # Detector start-up is paid before the clock starts.
+    with app.app_context():
+        init_db()
+        if not manager._ensure_detector():
+            print(f"Detector unavailable: {manager.detector_error}", file=sys.stderr)
+            return 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        results = list(
+            executor.map(
+                lambda index: replay_session(app, manager, timings, frames, index, args),
+                range(args.sessions),
+            )
+        )
+    elapsed = time.perf_counter() - started
+
+    frame_count = sum(steps for _, steps in results)
+    print(
+        f"{len(frames)} source frames, {args.sessions} sessions, concurrency {args.concurrency}, "
+        f"{'fake' if args.fake_detector else app.config['EYE_DETECTOR_BACKEND']} detector"
+    )
+    timings.report()
+    print(f"frames/sec     {frame_count / elapsed:.1f} ({frame_count} frames in {elapsed:.2f}s)")
+    outcomes = Counter(outcome for outcome, _ in results)
+    print("outcomes       " + ", ".join(f"{name}={count}" for name, count in sorted(outcomes.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
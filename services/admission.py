@@ -0,0 +1,55 @@
+import threading
+
+
+class AdmissionController:
+    # Per-process gate in front of frame processing: at most one outstanding
+    # frame per session, a cap on frames in flight, and an optional ceiling on
+    # concurrently active liveness sessions.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.busy_sessions = set()
+        self.active_sessions = set()
+        self.counters = {"admitted": 0, "session_busy": 0, "overloaded": 0, "at_capacity": 0}
+
+    def try_admit(self, key, max_in_flight, max_sessions):
+        # Returns None when the frame may proceed (release() must follow),
+        # otherwise the rejection reason.
+        with self.lock:
+            if key in self.busy_sessions:
+                reason = "session_busy"
+            elif max_in_flight and self.in_flight >= max_in_flight:
+                reason = "overloaded"
+            elif (
+                max_sessions
+                and key not in self.active_sessions
+                and len(self.active_sessions) >= max_sessions
+            ):
+                reason = "at_capacity"
+            else:
+                reason = None
+                self.in_flight += 1
+                self.busy_sessions.add(key)
+                self.active_sessions.add(key)
+
+            self.counters[reason or "admitted"] += 1
+            return reason
+
+    def release(self, key, finished=False):
+        with self.lock:
+            self.in_flight -= 1
+            self.busy_sessions.discard(key)
+            if finished:
+                self.active_sessions.discard(key)
+
+    def forget(self, key):
+        with self.lock:
+            self.active_sessions.discard(key)
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                in_flight=self.in_flight,
+                active_sessions=len(self.active_sessions),
+            )
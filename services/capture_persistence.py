@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.user import update_verification_event_refs
+from services.metrics import observe_stage
+from services.storage_service import upload_capture
+from utils.image_utils import sanitize_filename
+
+
+class CapturePersister:
+    # Writes and uploads the winning captures of a finished session off the
+    # request thread, then fills the refs on the event row that was already logged.
+    def __init__(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _ensure_executor(self, app):
+        if self.executor is not None:
+            return self.executor
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=max(1, app.config.get("CAPTURE_PERSIST_WORKERS", 2)),
+                    thread_name_prefix="capture-persist",
+                )
+        return self.executor
+
+    def submit(self, app, event_id, email, token, images):
+        if not images:
+            return None
+        return self._ensure_executor(app).submit(
+            self._persist, app, event_id, email, token, images
+        )
+
+    def _persist(self, app, event_id, email, token, images):
+        with app.app_context():
+            try:
+                refs = {
+                    f"{eye_state}_capture_ref": self._persist_image(
+                        app, image, email, token, eye_state
+                    )
+                    for eye_state, image in images.items()
+                }
+                update_verification_event_refs(event_id, **refs)
+            except Exception as exc:
+                app.logger.exception("Capture persistence failed for %s: %s", email, exc)
+
+    @staticmethod
+    def _persist_image(app, image, email, token, eye_state):
+        if eye_state == "open":
+            target_dir = app.config["OPEN_EYE_UPLOAD_DIR"]
+        else:
+            target_dir = app.config["CLOSED_EYE_UPLOAD_DIR"]
+
+        timestamp_ms = int(time.time() * 1000)
+        file_name = f"{sanitize_filename(email)}_{eye_state}_{timestamp_ms}.jpg"
+        file_path = os.path.join(target_dir, file_name)
+        started = time.perf_counter()
+        with open(file_path, "wb") as handle:
+            handle.write(image)
+        observe_stage("capture_write", (time.perf_counter() - started) * 1000.0)
+
+        folder_base = app.config.get("CLOUDINARY_FOLDER", "eye-verification")
+        public_id = (
+            f"{sanitize_filename(email)}_"
+            f"{sanitize_filename(token)[:20]}_"
+            f"{eye_state}_{timestamp_ms}"
+        )
+        started = time.perf_counter()
+        cloud_url = upload_capture(
+            file_path=file_path,
+            folder=f"{folder_base}/{eye_state}",
+            public_id=public_id,
+        )
+        observe_stage("capture_upload", (time.perf_counter() - started) * 1000.0)
+        if cloud_url:
+            return cloud_url
+        return file_path.replace("\\", "/")
+
+
+capture_persister = CapturePersister()
@@ -0,0 +1,115 @@
+import threading
+from contextlib import contextmanager
+
+
+class DetectorPool:
+    # FaceMesh in tracking mode keeps state from the previous frame, so a
+    # session is bound to the detector that served it last. acquire(key)
+    # returns that detector when it is idle; otherwise it takes an unbound idle
+    # detector, then the least recently used one, and rebinds it to the key.
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self._idle = []
+        self._created = 0
+        self._waiting = 0
+        self._owners = {}
+        self._bindings = {}
+        self._counters = {"affinity_hit": 0, "assigned": 0, "reassigned": 0}
+        self._condition = threading.Condition()
+
+    def prime(self):
+        # Builds one detector up front so model load errors surface immediately.
+        detector = self._checkout()
+        self._checkin(detector)
+
+    @contextmanager
+    def acquire(self, key=None):
+        detector = self._checkout(key)
+        try:
+            yield detector
+        finally:
+            self._checkin(detector)
+
+    def unbind(self, key):
+        # Called when a session ends; its detector becomes the first choice
+        # for the next new session.
+        with self._condition:
+            detector = self._bindings.pop(key, None)
+            if detector is not None:
+                self._owners.pop(id(detector), None)
+
+    def load(self):
+        # Requests holding or waiting for a detector, relative to the pool size.
+        with self._condition:
+            busy = self._created - len(self._idle)
+            return (busy + self._waiting) / float(self.size)
+
+    def stats(self):
+        with self._condition:
+            return dict(self._counters, bound_sessions=len(self._bindings))
+
+    def _take_idle(self, key):
+        # _idle is ordered by check-in time, oldest first.
+        if key is None:
+            return self._idle.pop()
+
+        bound = self._bindings.get(key)
+        if bound is not None and any(detector is bound for detector in self._idle):
+            self._idle.remove(bound)
+            self._counters["affinity_hit"] += 1
+            return bound
+
+        unbound = (
+            position
+            for position, detector in enumerate(self._idle)
+            if id(detector) not in self._owners
+        )
+        index = next(unbound, 0)
+        detector = self._idle.pop(index)
+        previous_owner = self._owners.get(id(detector))
+        if previous_owner is not None:
+            del self._bindings[previous_owner]
+            self._counters["reassigned"] += 1
+        else:
+            self._counters["assigned"] += 1
+        self._bind(key, detector)
+        return detector
+
+    def _bind(self, key, detector):
+        previous = self._bindings.get(key)
+        if previous is not None:
+            self._owners.pop(id(previous), None)
+        self._bindings[key] = detector
+        self._owners[id(detector)] = key
+
+    def _checkout(self, key=None):
+        with self._condition:
+            while not self._idle and self._created >= self.size:
+                self._waiting += 1
+                try:
+                    self._condition.wait()
+                finally:
+                    self._waiting -= 1
+            if self._idle:
+                return self._take_idle(key)
+            self._created += 1
+
+        try:
+            detector = self.factory()
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+        if key is not None:
+            with self._condition:
+                self._counters["assigned"] += 1
+                self._bind(key, detector)
+        return detector
+
+    def _checkin(self, detector):
+        with self._condition:
+            self._idle.append(detector)
+            self._condition.notify()
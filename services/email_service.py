@@ -3,6 +3,7 @@ import socket
 import json
 import time
 import base64
+import threading
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -11,6 +12,8 @@ from email.mime.text import MIMEText
 
 from flask import current_app
 
+from services.metrics import EMAIL_SEND_SECONDS
+
 
 def build_verification_url(token, base_url_override=None):
     base_url = (base_url_override or current_app.config["APP_BASE_URL"]).rstrip("/")
@@ -20,6 +23,83 @@ def build_verification_url(token, base_url_override=None):
 _gmail_access_token_cache = {"token": "", "expires_at": 0}
 
 
+class _CircuitBreaker:
+    # Skips a provider after repeated failures so queued sends stop paying its
+    # timeout; one trial request is let through once the reset window passes.
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        threshold = current_app.config.get("MAIL_BREAKER_FAILURES", 3)
+        reset_seconds = current_app.config.get("MAIL_BREAKER_RESET_SECONDS", 60)
+        with self.lock:
+            if self.failures < threshold:
+                return True
+            if time.monotonic() - self.opened_at >= reset_seconds:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def retry_in(self):
+        # Seconds until allow() lets the next trial request through; 0 while closed.
+        threshold = current_app.config.get("MAIL_BREAKER_FAILURES", 3)
+        reset_seconds = current_app.config.get("MAIL_BREAKER_RESET_SECONDS", 60)
+        with self.lock:
+            if self.failures < threshold:
+                return 0.0
+            return max(0.0, reset_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.opened_at = time.monotonic()
+
+
+_BREAKERS = {
+    "gmail_api": _CircuitBreaker("gmail_api"),
+    "resend": _CircuitBreaker("resend"),
+    "smtp": _CircuitBreaker("smtp"),
+}
+
+
+def is_email_provider_configured():
+    return bool(
+        _is_gmail_api_configured()
+        or current_app.config.get("RESEND_API_KEY", "")
+        or (current_app.config["MAIL_USERNAME"] and current_app.config["MAIL_PASSWORD"])
+    )
+
+
+def email_circuit_retry_in():
+    # Seconds until at least one configured provider would be tried again;
+    # 0 when one can be tried now (or none is configured at all).
+    providers = []
+    if _is_gmail_api_configured():
+        providers.append("gmail_api")
+    if current_app.config.get("RESEND_API_KEY", ""):
+        providers.append("resend")
+    if current_app.config["MAIL_USERNAME"] and current_app.config["MAIL_PASSWORD"]:
+        providers.append("smtp")
+    if not providers:
+        return 0.0
+    return min(_BREAKERS[name].retry_in() for name in providers)
+
+
+def _observe_send(provider, started, sent):
+    EMAIL_SEND_SECONDS.observe(
+        time.perf_counter() - started,
+        provider,
+        "sent" if sent else "failed",
+    )
+
+
 def _build_message(sender, recipient_email, verification_url):
     message = MIMEMultipart("alternative")
     message["Subject"] = "Eye Verification - Email Confirmation"
@@ -126,18 +206,27 @@ def send_verification_email(recipient_email, token, base_url_override=None):
         return False, verification_url, "No email provider credentials are configured."
 
     errors = []
-    if _is_gmail_api_configured():
+    if _is_gmail_api_configured() and not _BREAKERS["gmail_api"].allow():
+        errors.append("GmailAPI: circuit open")
+    elif _is_gmail_api_configured():
+        started = time.perf_counter()
         try:
             sent = _send_via_gmail_api(message)
             if sent:
+                _observe_send("gmail_api", started, True)
+                _BREAKERS["gmail_api"].record_success()
                 return True, verification_url, ""
             errors.append("Gmail API returned non-success status.")
         except (urllib.error.HTTPError, urllib.error.URLError, RuntimeError, ValueError) as exc:
             errors.append(f"GmailAPI:{type(exc).__name__}:{exc}")
             current_app.logger.warning("Gmail API send failed: %s", exc)
+        _observe_send("gmail_api", started, False)
+        _BREAKERS["gmail_api"].record_failure()
 
     resend_error = ""
-    if resend_api_key:
+    if resend_api_key and not _BREAKERS["resend"].allow():
+        errors.append("Resend: circuit open")
+    elif resend_api_key:
         from_email = (
             current_app.config.get("RESEND_FROM_EMAIL")
             or sender
@@ -163,9 +252,12 @@ def send_verification_email(recipient_email, token, base_url_override=None):
                 ),
             },
         )
+        started = time.perf_counter()
         try:
             with urllib.request.urlopen(req, timeout=15) as response:
                 if response.status in (200, 201):
+                    _observe_send("resend", started, True)
+                    _BREAKERS["resend"].record_success()
                     return True, verification_url, ""
                 current_app.logger.warning("Resend returned non-success status: %s", response.status)
                 resend_error = f"Resend HTTP status {response.status}"
@@ -179,6 +271,8 @@ def send_verification_email(recipient_email, token, base_url_override=None):
 
         # If Resend is configured but fails, continue to SMTP fallback.
         if resend_error:
+            _observe_send("resend", started, False)
+            _BREAKERS["resend"].record_failure()
             current_app.logger.warning("Resend attempt failed, falling back to SMTP: %s", resend_error)
             errors.append(resend_error)
 
@@ -189,7 +283,9 @@ def send_verification_email(recipient_email, token, base_url_override=None):
     use_ssl_fallback = current_app.config["MAIL_USE_SSL_FALLBACK"]
 
     attempts = []
-    if username and password:
+    if username and password and not _BREAKERS["smtp"].allow():
+        errors.append("SMTP: circuit open")
+    elif username and password:
         attempts.append((primary_port, use_tls, "primary"))
         if use_ssl_fallback and not (primary_port == 465 and not use_tls):
             attempts.append((465, False, "fallback_ssl_465"))
@@ -199,6 +295,7 @@ def send_verification_email(recipient_email, token, base_url_override=None):
         return False, verification_url, " | ".join(errors)
 
     for port, tls_enabled, label in attempts:
+        started = time.perf_counter()
         try:
             if tls_enabled:
                 with smtplib.SMTP(host, port, timeout=timeout_seconds) as smtp:
@@ -209,8 +306,11 @@ def send_verification_email(recipient_email, token, base_url_override=None):
                 with smtplib.SMTP_SSL(host, port, timeout=timeout_seconds) as smtp:
                     smtp.login(username, password)
                     smtp.sendmail(sender, [recipient_email], message.as_string())
+            _observe_send("smtp", started, True)
+            _BREAKERS["smtp"].record_success()
             return True, verification_url, ""
         except (smtplib.SMTPException, socket.timeout, OSError) as exc:
+            _observe_send("smtp", started, False)
             errors.append(f"{label}:{type(exc).__name__}:{exc}")
             current_app.logger.warning(
                 "Email send attempt failed (%s on %s:%s): %s",
@@ -220,6 +320,8 @@ def send_verification_email(recipient_email, token, base_url_override=None):
                 exc,
             )
 
+    if attempts:
+        _BREAKERS["smtp"].record_failure()
     current_app.logger.error("All email send attempts failed.")
     if not attempts and errors:
         return False, verification_url, " | ".join(errors)
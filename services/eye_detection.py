@@ -1,23 +1,109 @@
-import math
+import os
+import time
 
 import cv2
+import numpy as np
 
-from utils.constants import EAR_CLOSED_THRESHOLD, EAR_OPEN_THRESHOLD
+from services.face_detection import (
+    FaceBox,
+    evaluate_face_alignment,
+    extract_face_box,
+    landmarks_to_array,
+)
+from utils.constants import (
+    BLINK_SCORE_CLOSED_THRESHOLD,
+    BLINK_SCORE_OPEN_THRESHOLD,
+    EAR_CLOSED_THRESHOLD,
+    EAR_OPEN_THRESHOLD,
+)
 
 
 LEFT_EYE_INDICES = (33, 160, 158, 133, 153, 144)
 RIGHT_EYE_INDICES = (362, 385, 387, 263, 373, 380)
+EYE_INDICES = np.array([LEFT_EYE_INDICES, RIGHT_EYE_INDICES])
+EAR_START_INDICES = EYE_INDICES[:, [0, 1, 2]]
+EAR_END_INDICES = EYE_INDICES[:, [3, 5, 4]]
+EYE_DETECTOR_BACKENDS = ("face_mesh", "cascade", "face_landmarker")
 
 
-class EyeDetector:
-    def __init__(self):
-        import mediapipe as mp  # Lazy import prevents heavy startup side effects.
+def _load_mediapipe():
+    import mediapipe as mp  # Lazy import prevents heavy startup side effects.
 
-        if not hasattr(mp, "solutions"):
-            raise RuntimeError(
-                "Installed mediapipe package does not expose Face Mesh 'solutions'. "
-                "Install compatible version: pip install mediapipe==0.10.14"
-            )
+    if not hasattr(mp, "solutions"):
+        raise RuntimeError(
+            "Installed mediapipe package does not expose Face Mesh 'solutions'. "
+            "Install compatible version: pip install mediapipe==0.10.14"
+        )
+    return mp
+
+
+def _load_mediapipe_tasks():
+    import mediapipe as mp
+
+    if not hasattr(mp, "tasks"):
+        raise RuntimeError(
+            "Installed mediapipe package does not expose the Tasks API. "
+            "Install compatible version: pip install mediapipe==0.10.14"
+        )
+    return mp
+
+
+class DetectorBackend:
+    # analyze(frame_bgr, region) returns face_count, face_landmarks (an (N, 3)
+    # pixel array or None), face_box, ear and eye_state (OPEN, CLOSED or
+    # UNSURE). region (the upload's place in the camera frame) is only used by
+    # backends that check alignment themselves.
+    def analyze(self, frame_bgr, region=None):
+        raise NotImplementedError
+
+    @staticmethod
+    def _compute_ears(points):
+        # Rows are (left, right) eyes. Each row holds the p1-p4, p2-p6 and p3-p5
+        # distances of the EAR formula, taken from one gather of the landmarks.
+        deltas = points[EAR_START_INDICES, :2] - points[EAR_END_INDICES, :2]
+        distances = np.sqrt((deltas * deltas).sum(axis=2))
+        horizontal = distances[:, 0]
+        ears = np.zeros(len(horizontal))
+        np.divide(
+            distances[:, 1] + distances[:, 2],
+            2.0 * horizontal,
+            out=ears,
+            where=horizontal > 0,
+        )
+        return ears
+
+    @staticmethod
+    def _classify_eye_state(ear):
+        if ear >= EAR_OPEN_THRESHOLD:
+            return "OPEN"
+        if ear <= EAR_CLOSED_THRESHOLD:
+            return "CLOSED"
+        return "UNSURE"
+
+    @staticmethod
+    def _without_landmarks(face_count, face_box=None):
+        return {
+            "face_count": face_count,
+            "face_landmarks": None,
+            "face_box": face_box,
+            "ear": None,
+            "eye_state": "UNSURE",
+        }
+
+    def _landmark_result(self, points, frame_shape):
+        avg_ear = float(self._compute_ears(points).mean())
+        return {
+            "face_count": 1,
+            "face_landmarks": points,
+            "face_box": extract_face_box(points, frame_shape),
+            "ear": avg_ear,
+            "eye_state": self._classify_eye_state(avg_ear),
+        }
+
+
+class EyeDetector(DetectorBackend):
+    def __init__(self):
+        mp = _load_mediapipe()
         self.face_mesh = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=False,
             max_num_faces=2,
@@ -26,60 +112,152 @@ class EyeDetector:
             min_tracking_confidence=0.5,
         )
 
-    @staticmethod
-    def _point(face_landmarks, index, frame_width, frame_height):
-        landmark = face_landmarks.landmark[index]
-        return landmark.x * frame_width, landmark.y * frame_height
+    def analyze(self, frame_bgr, region=None):
+        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        results = self.face_mesh.process(frame_rgb)
+
+        faces = results.multi_face_landmarks or []
+        if len(faces) != 1:
+            return self._without_landmarks(len(faces))
+
+        points = landmarks_to_array(faces[0], frame_bgr.shape)
+        return self._landmark_result(points, frame_bgr.shape)
+
+
+class CascadeEyeDetector(EyeDetector):
+    # The short-range face detector settles face count and position first;
+    # frames with no face, several faces or a misaligned face never reach
+    # Face Mesh, which otherwise only sees the padded face crop.
+    def __init__(self, face_padding=0.25):
+        mp = _load_mediapipe()
+        self.face_padding = face_padding
+        self.face_detection = mp.solutions.face_detection.FaceDetection(
+            model_selection=0,
+            min_detection_confidence=0.5,
+        )
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=False,
+            max_num_faces=1,
+            refine_landmarks=True,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5,
+        )
 
     @staticmethod
-    def _distance(point_a, point_b):
-        return math.dist(point_a, point_b)
+    def _detection_box(detection, frame_shape):
+        frame_height, frame_width = frame_shape[:2]
+        box = detection.location_data.relative_bounding_box
+        left = min(max(0, int(box.xmin * frame_width)), frame_width - 1)
+        top = min(max(0, int(box.ymin * frame_height)), frame_height - 1)
+        right = min(frame_width, int((box.xmin + box.width) * frame_width))
+        bottom = min(frame_height, int((box.ymin + box.height) * frame_height))
+        return FaceBox(x=left, y=top, width=max(1, right - left), height=max(1, bottom - top))
+
+    def _crop_bounds(self, face_box, frame_shape):
+        frame_height, frame_width = frame_shape[:2]
+        padding = self.face_padding * max(face_box.width, face_box.height)
+        left = max(0, int(face_box.x - padding))
+        top = max(0, int(face_box.y - padding))
+        right = min(frame_width, int(face_box.x + face_box.width + padding))
+        bottom = min(frame_height, int(face_box.y + face_box.height + padding))
+        return left, top, right, bottom
+
+    def analyze(self, frame_bgr, region=None):
+        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        detections = self.face_detection.process(frame_rgb).detections or []
+        if len(detections) != 1:
+            return self._without_landmarks(len(detections))
+
+        face_box = self._detection_box(detections[0], frame_bgr.shape)
+        source_box, source_shape = face_box, frame_bgr.shape
+        if region is not None:
+            source_box = region.to_source(face_box, frame_bgr.shape)
+            source_shape = region.source_shape
+        aligned, _ = evaluate_face_alignment(source_box, source_shape)
+        if not aligned:
+            # The manager repeats the check on this box and reports why.
+            return self._without_landmarks(1, face_box)
+
+        left, top, right, bottom = self._crop_bounds(face_box, frame_bgr.shape)
+        crop = np.ascontiguousarray(frame_rgb[top:bottom, left:right])
+        faces = self.face_mesh.process(crop).multi_face_landmarks or []
+        if not faces:
+            return self._without_landmarks(0)
+
+        points = landmarks_to_array(faces[0], crop.shape)
+        points[:, 0] += left
+        points[:, 1] += top
+        return self._landmark_result(points, frame_bgr.shape)
+
 
-    def _compute_ear(self, face_landmarks, indices, frame_width, frame_height):
-        p1 = self._point(face_landmarks, indices[0], frame_width, frame_height)
-        p2 = self._point(face_landmarks, indices[1], frame_width, frame_height)
-        p3 = self._point(face_landmarks, indices[2], frame_width, frame_height)
-        p4 = self._point(face_landmarks, indices[3], frame_width, frame_height)
-        p5 = self._point(face_landmarks, indices[4], frame_width, frame_height)
-        p6 = self._point(face_landmarks, indices[5], frame_width, frame_height)
+class FaceLandmarkerEyeDetector(DetectorBackend):
+    # MediaPipe Tasks FaceLandmarker in VIDEO mode: tracks between frames like
+    # Face Mesh and also scores the eyeBlinkLeft / eyeBlinkRight blendshapes,
+    # which decide the eye state here. EAR is still reported from the
+    # landmarks (same 478-point topology as refined Face Mesh).
+    def __init__(self, model_path):
+        if not model_path or not os.path.isfile(model_path):
+            raise RuntimeError(
+                f"FaceLandmarker model not found at '{model_path}'. "
+                "Download face_landmarker.task and set FACE_LANDMARKER_MODEL_PATH."
+            )
+        mp = _load_mediapipe_tasks()
+        vision = mp.tasks.vision
+        options = vision.FaceLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_path),
+            running_mode=vision.RunningMode.VIDEO,
+            num_faces=2,
+            min_face_detection_confidence=0.5,
+            min_face_presence_confidence=0.5,
+            min_tracking_confidence=0.5,
+            output_face_blendshapes=True,
+        )
+        self.mp = mp
+        self.landmarker = vision.FaceLandmarker.create_from_options(options)
+        self.last_timestamp_ms = 0
 
-        horizontal = self._distance(p1, p4)
-        if horizontal == 0:
-            return 0.0
+    def _next_timestamp_ms(self):
+        # VIDEO mode rejects timestamps that do not increase; frames of pooled
+        # detectors can arrive within the same millisecond.
+        self.last_timestamp_ms = max(self.last_timestamp_ms + 1, int(time.monotonic() * 1000))
+        return self.last_timestamp_ms
 
-        vertical = self._distance(p2, p6) + self._distance(p3, p5)
-        return vertical / (2.0 * horizontal)
+    @staticmethod
+    def _blink_score(blendshapes):
+        scores = {category.category_name: category.score for category in blendshapes}
+        return (scores.get("eyeBlinkLeft", 0.0) + scores.get("eyeBlinkRight", 0.0)) / 2.0
 
     @staticmethod
-    def _classify_eye_state(ear):
-        if ear >= EAR_OPEN_THRESHOLD:
-            return "OPEN"
-        if ear <= EAR_CLOSED_THRESHOLD:
+    def _classify_blink_score(score):
+        if score >= BLINK_SCORE_CLOSED_THRESHOLD:
             return "CLOSED"
+        if score <= BLINK_SCORE_OPEN_THRESHOLD:
+            return "OPEN"
         return "UNSURE"
 
-    def analyze(self, frame_bgr):
-        frame_height, frame_width = frame_bgr.shape[:2]
+    def analyze(self, frame_bgr, region=None):
         frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(frame_rgb)
+        image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=frame_rgb)
+        results = self.landmarker.detect_for_video(image, self._next_timestamp_ms())
 
-        faces = results.multi_face_landmarks or []
+        faces = results.face_landmarks or []
         if len(faces) != 1:
-            return {
-                "face_count": len(faces),
-                "face_landmarks": None,
-                "ear": None,
-                "eye_state": "UNSURE",
-            }
-
-        face_landmarks = faces[0]
-        left_ear = self._compute_ear(face_landmarks, LEFT_EYE_INDICES, frame_width, frame_height)
-        right_ear = self._compute_ear(face_landmarks, RIGHT_EYE_INDICES, frame_width, frame_height)
-        avg_ear = (left_ear + right_ear) / 2.0
+            return self._without_landmarks(len(faces))
 
-        return {
-            "face_count": 1,
-            "face_landmarks": face_landmarks,
-            "ear": avg_ear,
-            "eye_state": self._classify_eye_state(avg_ear),
-        }
+        points = landmarks_to_array(faces[0], frame_bgr.shape)
+        result = self._landmark_result(points, frame_bgr.shape)
+        if results.face_blendshapes:
+            blink_score = self._blink_score(results.face_blendshapes[0])
+            result["blink_score"] = blink_score
+            result["eye_state"] = self._classify_blink_score(blink_score)
+        return result
+
+
+def create_eye_detector(kind="face_mesh", face_padding=0.25, landmarker_model=""):
+    if kind == "cascade":
+        return CascadeEyeDetector(face_padding)
+    if kind == "face_landmarker":
+        return FaceLandmarkerEyeDetector(landmarker_model)
+    if kind == "face_mesh":
+        return EyeDetector()
+    raise ValueError(f"Unknown eye detector backend: {kind}")
@@ -1,4 +1,8 @@
 from dataclasses import dataclass
+from itertools import chain
+from operator import attrgetter
+
+import numpy as np
 
 from utils.constants import (
     FACE_CENTER_TOLERANCE,
@@ -19,16 +23,135 @@ class FaceBox:
         return self.x + (self.width / 2.0)
 
 
-def extract_face_box(face_landmarks, frame_shape):
+@dataclass
+class FrameRegion:
+    # Where an uploaded (possibly cropped and downscaled) frame sits inside the
+    # full camera frame, in source pixels.
+    x: int
+    y: int
+    width: int
+    height: int
+    source_width: int
+    source_height: int
+
+    @classmethod
+    def parse(cls, value):
+        if not value:
+            return None
+        try:
+            x, y, width, height, source_width, source_height = (
+                int(float(part)) for part in value.split(",")
+            )
+        except (TypeError, ValueError):
+            return None
+
+        if min(width, height, source_width, source_height) <= 0 or x < 0 or y < 0:
+            return None
+        if x + width > source_width or y + height > source_height:
+            return None
+        return cls(x, y, width, height, source_width, source_height)
+
+    @property
+    def source_shape(self):
+        return (self.source_height, self.source_width)
+
+    def is_full_resolution(self, frame_shape):
+        frame_height, frame_width = frame_shape[:2]
+        return (
+            self.x == 0
+            and self.y == 0
+            and self.width == self.source_width
+            and self.height == self.source_height
+            and frame_width >= self.source_width
+            and frame_height >= self.source_height
+        )
+
+    def to_source(self, face_box, frame_shape):
+        frame_height, frame_width = frame_shape[:2]
+        scale_x = self.width / float(frame_width)
+        scale_y = self.height / float(frame_height)
+        return FaceBox(
+            x=int(self.x + face_box.x * scale_x),
+            y=int(self.y + face_box.y * scale_y),
+            width=max(1, int(face_box.width * scale_x)),
+            height=max(1, int(face_box.height * scale_y)),
+        )
+
+
+# Wire layout of one NormalizedLandmark holding x, y and z: the record tag and
+# length, then each float field tag followed by a little-endian float32.
+_LANDMARK_RECORD = np.dtype(
+    [
+        ("tag", "u1"),
+        ("size", "u1"),
+        ("x_tag", "u1"),
+        ("x", "<f4"),
+        ("y_tag", "u1"),
+        ("y", "<f4"),
+        ("z_tag", "u1"),
+        ("z", "<f4"),
+    ]
+)
+_LANDMARK_RECORD_TAGS = (
+    ("tag", 0x0A),
+    ("size", 15),
+    ("x_tag", 0x0D),
+    ("y_tag", 0x15),
+    ("z_tag", 0x1D),
+)
+_LANDMARK_COORDINATES = attrgetter("x", "y", "z")
+
+
+def _landmarks_from_wire(face_landmarks):
+    # Attribute access on protobuf landmarks dominates the per-frame cost, so
+    # decode the serialized list in one go. Anything that does not match the
+    # fixed layout (a zero coordinate omitted on the wire, extra fields) returns
+    # None and takes the attribute path instead.
+    serialize = getattr(face_landmarks, "SerializeToString", None)
+    if serialize is None:
+        return None
+    payload = serialize()
+    if not payload or len(payload) % _LANDMARK_RECORD.itemsize:
+        return None
+
+    records = np.frombuffer(payload, dtype=_LANDMARK_RECORD)
+    for field, expected in _LANDMARK_RECORD_TAGS:
+        if not (records[field] == expected).all():
+            return None
+
+    points = np.empty((len(records), 3))
+    points[:, 0] = records["x"]
+    points[:, 1] = records["y"]
+    points[:, 2] = records["z"]
+    return points
+
+
+def landmarks_to_array(face_landmarks, frame_shape):
+    # Converts the landmarks once per frame; every geometric feature afterwards
+    # is array indexing on the (N, 3) result, in pixels (z shares the x scale).
     frame_height, frame_width = frame_shape[:2]
+    points = _landmarks_from_wire(face_landmarks)
+    if points is None:
+        # Face Mesh wraps the list in a proto; Tasks results are plain lists.
+        landmarks = getattr(face_landmarks, "landmark", face_landmarks)
+        points = np.fromiter(
+            chain.from_iterable(map(_LANDMARK_COORDINATES, landmarks)),
+            dtype=np.float64,
+            count=len(landmarks) * 3,
+        ).reshape(-1, 3)
+    points *= (frame_width, frame_height, frame_width)
+    return points
+
 
-    x_points = [point.x * frame_width for point in face_landmarks.landmark]
-    y_points = [point.y * frame_height for point in face_landmarks.landmark]
+def extract_face_box(points, frame_shape):
+    frame_height, frame_width = frame_shape[:2]
 
-    min_x = max(0, int(min(x_points)))
-    max_x = min(frame_width - 1, int(max(x_points)))
-    min_y = max(0, int(min(y_points)))
-    max_y = min(frame_height - 1, int(max(y_points)))
+    x_points = points[:, 0]
+    y_points = points[:, 1]
+    min_x = max(0, int(x_points.min()))
+    max_x = min(frame_width - 1, int(x_points.max()))
+    min_y = max(0, int(y_points.min()))
+    max_y = min(frame_height - 1, int(y_points.max()))
 
     return FaceBox(
         x=min_x,
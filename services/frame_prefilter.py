@@ -0,0 +1,70 @@
+import threading
+
+import cv2
+
+
+THUMBNAIL_WIDTH = 96
+
+
+class FramePrefilter:
+    # Cheap checks on a small grayscale thumbnail that run before FaceMesh.
+    # Black and featureless frames are rejected outright; a frame that is
+    # (almost) identical to the session's previous one reuses that frame's
+    # pending result, because re-applying the same eye state cannot move the
+    # blink state machine or improve a capture.
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.counters = {"dark": 0, "featureless": 0, "duplicate": 0, "passed": 0}
+
+    @staticmethod
+    def thumbnail(frame):
+        frame_height, frame_width = frame.shape[:2]
+        thumb_height = max(1, round(frame_height * THUMBNAIL_WIDTH / float(frame_width)))
+        small = cv2.resize(frame, (THUMBNAIL_WIDTH, thumb_height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _count(self, verdict):
+        with self.lock:
+            self.counters[verdict] += 1
+
+    def inspect(self, key, frame, min_brightness, min_detail, duplicate_diff):
+        # Returns (verdict, thumbnail, cached). verdict is "dark", "featureless",
+        # "duplicate" (cached holds the previous result and observation) or "passed".
+        thumb = self.thumbnail(frame)
+        if float(thumb.mean()) < min_brightness:
+            self._count("dark")
+            return "dark", thumb, None
+
+        if float(cv2.Laplacian(thumb, cv2.CV_32F).var()) < min_detail:
+            self._count("featureless")
+            return "featureless", thumb, None
+
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry["thumbnail"].shape == thumb.shape:
+            difference = cv2.absdiff(entry["thumbnail"], thumb)
+            # Max rather than mean: a blink only touches a few thumbnail pixels.
+            if int(difference.max()) <= duplicate_diff:
+                self._count("duplicate")
+                return "duplicate", thumb, entry
+
+        self._count("passed")
+        return "passed", thumb, None
+
+    def remember(self, key, thumb, result, observation):
+        with self.lock:
+            self.entries[key] = {
+                "thumbnail": thumb,
+                "result": dict(result),
+                "observation": dict(observation),
+            }
+
+    def forget(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, tracked_sessions=len(self.entries))
+
@@ -0,0 +1,144 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from services.eye_detection import DetectorBackend, create_eye_detector
+
+
+DEFAULT_BUFFER_BYTES = 1920 * 1080 * 3
+WORKER_START_TIMEOUT_SECONDS = 60
+
+
+def _worker_main(conn, buffer_name, detector_kind, face_padding, landmarker_model):
+    # Runs in a spawned process: owns one eye detector and reads frames straight
+    # out of the shared buffer, so only shape/dtype and the small result cross
+    # the pipe.
+    try:
+        detector = create_eye_detector(detector_kind, face_padding, landmarker_model)
+    except Exception as exc:
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        return
+
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    conn.send(("ready", None))
+    try:
+        while True:
+            try:
+                command, payload = conn.recv()
+            except EOFError:
+                break
+
+            if command == "stop":
+                break
+            if command == "attach":
+                buffer.close()
+                buffer = shared_memory.SharedMemory(name=payload)
+                continue
+
+            shape, dtype, region = payload
+            frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer.buf)
+            try:
+                result = detector.analyze(frame, region)
+                result["face_landmarks"] = None
+                conn.send(("ok", result))
+            except Exception as exc:
+                conn.send(("error", f"{type(exc).__name__}: {exc}"))
+            finally:
+                del frame
+    finally:
+        buffer.close()
+
+
+class ProcessEyeDetector(DetectorBackend):
+    def __init__(
+        self,
+        buffer_bytes=None,
+        detector_kind="face_mesh",
+        face_padding=0.25,
+        landmarker_model="",
+    ):
+        self.buffer_bytes = int(buffer_bytes or DEFAULT_BUFFER_BYTES)
+        self.detector_kind = detector_kind
+        self.face_padding = face_padding
+        self.landmarker_model = landmarker_model
+        self.context = multiprocessing.get_context("spawn")
+        self.buffer = None
+        self.conn = None
+        self.process = None
+        self._start()
+
+    def _start(self):
+        self.buffer = shared_memory.SharedMemory(create=True, size=self.buffer_bytes)
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                self.buffer.name,
+                self.detector_kind,
+                self.face_padding,
+                self.landmarker_model,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        if not self.conn.poll(WORKER_START_TIMEOUT_SECONDS):
+            self.close()
+            raise RuntimeError("Inference worker did not start in time.")
+        status, detail = self.conn.recv()
+        if status != "ready":
+            self.close()
+            raise RuntimeError(f"Inference worker failed to start: {detail}")
+
+    def _grow_buffer(self, size):
+        old_buffer = self.buffer
+        self.buffer = shared_memory.SharedMemory(create=True, size=size)
+        self.buffer_bytes = size
+        self.conn.send(("attach", self.buffer.name))
+        old_buffer.close()
+        old_buffer.unlink()
+
+    def analyze(self, frame_bgr, region=None):
+        if self.process is None or not self.process.is_alive():
+            self.close()
+            self._start()
+
+        frame = np.ascontiguousarray(frame_bgr)
+        if frame.nbytes > self.buffer_bytes:
+            self._grow_buffer(frame.nbytes)
+
+        shared_frame = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.buffer.buf)
+        shared_frame[...] = frame
+        del shared_frame
+
+        try:
+            self.conn.send(("analyze", (frame.shape, frame.dtype.str, region)))
+            status, result = self.conn.recv()
+        except (EOFError, OSError) as exc:
+            self.close()
+            raise RuntimeError(f"Inference worker exited unexpectedly: {exc}") from exc
+
+        if status != "ok":
+            raise RuntimeError(f"Inference worker failed: {result}")
+        return result
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(("stop", None))
+            except (OSError, ValueError):
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer.unlink()
+            self.buffer = None
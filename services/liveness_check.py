@@ -1,63 +1,205 @@
-import os
+import hashlib
+import json
 import threading
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 import cv2
 from flask import current_app
 
-from services.eye_detection import EyeDetector
-from services.face_detection import evaluate_face_alignment, extract_face_box
-from services.storage_service import upload_capture
-from utils.constants import LIVENESS_TIMEOUT_SECONDS, MIN_FRAME_SHARPNESS
-from utils.image_utils import compute_sharpness, decode_base64_image, sanitize_filename
-
-
-@dataclass
+from services.admission import AdmissionController
+from services.capture_persistence import capture_persister
+from services.detector_pool import DetectorPool
+from services.eye_detection import EYE_DETECTOR_BACKENDS, create_eye_detector
+from services.face_detection import evaluate_face_alignment
+from services.frame_prefilter import FramePrefilter
+from services.inference_process import ProcessEyeDetector
+from services.metrics import FRAMES_TOTAL, observe_stage
+from services.outcome_writer import outcome_writer
+from services.session_reaper import SessionReaper
+from services.session_store import InMemorySessionStore, create_session_store
+from utils.constants import LIVENESS_TIMEOUT_SECONDS, MIN_FACE_SHARPNESS
+from utils.image_utils import compute_sharpness, decode_frame
+
+
+@dataclass(slots=True)
 class EyeFrameCapture:
     captured: bool = False
     score: float = -1.0
-    file_path: str = ""
-    storage_ref: str = ""
+    image: bytes = b""
+
+    def to_state(self):
+        # The image is not part of the serialized state; shared stores keep it
+        # in a separate row written only when the capture improves.
+        return [int(self.captured), round(self.score, 3)]
+
+    @classmethod
+    def from_state(cls, state):
+        captured, score = state[:2]
+        return cls(captured=bool(captured), score=score)
+
+
+_OPEN_BEFORE_CLOSE = 1
+_CLOSED_AFTER_OPEN = 2
+_REOPEN_AFTER_CLOSE = 4
+_SESSION_CLOSED = 8
+_SESSION_TIMED_OUT = 16
+_LATENCY_SMOOTHING = 0.2
+
+
+def _flag_property(bit):
+    def getter(self):
+        return bool(self.flags & bit)
+
+    def setter(self, value):
+        if value:
+            self.flags |= bit
+        else:
+            self.flags &= ~bit
+
+    return property(getter, setter)
 
 
 class LivenessSession:
+    # Slotted, with the blink stages and closed marker packed into one int, so
+    # lingering sessions cost a few small objects instead of several dicts.
+    __slots__ = (
+        "started_at",
+        "flags",
+        "open_eye",
+        "closed_eye",
+        "stored_state",
+        "stored_version",
+    )
+
+    saw_open_before_close = _flag_property(_OPEN_BEFORE_CLOSE)
+    saw_closed_after_open = _flag_property(_CLOSED_AFTER_OPEN)
+    saw_reopen_after_close = _flag_property(_REOPEN_AFTER_CLOSE)
+    closed = _flag_property(_SESSION_CLOSED)
+    timed_out = _flag_property(_SESSION_TIMED_OUT)
+
     def __init__(self):
         self.started_at = time.time()
+        self.flags = 0
         self.open_eye = EyeFrameCapture()
         self.closed_eye = EyeFrameCapture()
-        self.saw_open_before_close = False
-        self.saw_closed_after_open = False
-        self.saw_reopen_after_close = False
+        self.stored_state = None
+        self.stored_version = None
 
     def has_expired(self, timeout_seconds):
         return (time.time() - self.started_at) > timeout_seconds
 
+    def to_state(self):
+        return json.dumps(
+            {
+                "t": self.started_at,
+                "f": self.flags,
+                "o": self.open_eye.to_state(),
+                "c": self.closed_eye.to_state(),
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_state(cls, state):
+        data = json.loads(state)
+        session = cls()
+        session.started_at = data["t"]
+        session.flags = data["f"]
+        session.open_eye = EyeFrameCapture.from_state(data["o"])
+        session.closed_eye = EyeFrameCapture.from_state(data["c"])
+        return session
 
-class LivenessManager:
+
+class _SessionSlot:
     def __init__(self):
-        self.eye_detector = None
+        self.lock = threading.Lock()
+        self.holders = 0
+
+
+class LivenessManager:
+    def __init__(self, detector_factory=None, stage_observer=None):
+        self.detector_factory = detector_factory
+        # Optional callable(stage, elapsed_ms) for per-stage timings (see
+        # scripts/replay_benchmark.py); None keeps the hot path untouched.
+        self.stage_observer = stage_observer
+        self.detector_pool = None
         self.detector_error = None
-        self.sessions = {}
+        self.store = None
+        self.prefilter = FramePrefilter()
+        self.admission = AdmissionController()
+        self.reaper = SessionReaper(self._reap_session, sweep=self._sweep_shared_store)
+        self.session_slots = {}
+        self.inference_ms = 0.0
+        # Guards only the slot dict; frame work runs under each session's own slot lock.
         self.lock = threading.Lock()
+        self.pool_lock = threading.Lock()
 
     def _ensure_detector(self):
-        if self.eye_detector is not None:
+        if self.detector_pool is not None:
             return True
         if self.detector_error is not None:
             return False
 
-        try:
-            self.eye_detector = EyeDetector()
-            return True
-        except Exception as exc:
-            self.detector_error = str(exc)
-            current_app.logger.exception("Eye detector initialization failed: %s", exc)
-            return False
+        with self.pool_lock:
+            if self.detector_pool is not None:
+                return True
+            if self.detector_error is not None:
+                return False
+
+            try:
+                pool = DetectorPool(
+                    self.detector_factory or self._configured_detector_factory(),
+                    current_app.config.get("DETECTOR_POOL_SIZE", 1),
+                )
+                pool.prime()
+                self.detector_pool = pool
+                return True
+            except Exception as exc:
+                self.detector_error = str(exc)
+                current_app.logger.exception("Eye detector initialization failed: %s", exc)
+                return False
+
+    def _ensure_store(self):
+        if self.store is not None:
+            return self.store
+
+        with self.pool_lock:
+            if self.store is None:
+                self.store = create_session_store(
+                    current_app.config.get("LIVENESS_SESSION_STORE", "memory"),
+                    LivenessSession,
+                    current_app.config.get("LIVENESS_SESSION_DB_PATH", ""),
+                )
+        return self.store
+
+    @staticmethod
+    def _configured_detector_factory():
+        backend = current_app.config.get("INFERENCE_BACKEND", "thread")
+        detector_kind = current_app.config.get("EYE_DETECTOR_BACKEND", "face_mesh")
+        face_padding = current_app.config.get("CASCADE_FACE_PADDING", 0.25)
+        landmarker_model = current_app.config.get("FACE_LANDMARKER_MODEL_PATH", "")
+        if detector_kind not in EYE_DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown eye detector backend: {detector_kind}")
+        if backend == "process":
+            buffer_bytes = current_app.config.get("INFERENCE_SHM_BYTES")
+            return lambda: ProcessEyeDetector(
+                buffer_bytes=buffer_bytes,
+                detector_kind=detector_kind,
+                face_padding=face_padding,
+                landmarker_model=landmarker_model,
+            )
+        if backend != "thread":
+            raise ValueError(f"Unknown inference backend: {backend}")
+        return lambda: create_eye_detector(detector_kind, face_padding, landmarker_model)
 
     @staticmethod
     def _session_key(email, token):
-        return f"{email.lower()}::{token}"
+        # Fixed-size digest instead of the raw email and token: keys stay short
+        # in memory and in shared stores, and no credentials sit in the index.
+        identity = f"{email.lower()}\0{token}".encode("utf-8")
+        return hashlib.blake2b(identity, digest_size=16).hexdigest()
 
     @staticmethod
     def _capture_message(session):
@@ -86,213 +228,532 @@ class LivenessManager:
         return "Blink sequence complete."
 
     @staticmethod
-    def _save_frame(frame, target_dir, email, eye_state):
-        file_name = f"{sanitize_filename(email)}_{eye_state.lower()}_{int(time.time() * 1000)}.jpg"
-        file_path = os.path.join(target_dir, file_name)
-        cv2.imwrite(file_path, frame)
-        return file_path
+    def _encode_capture(frame, image_data):
+        # Uploaded frames are already JPEG bytes of exactly this frame; only the
+        # legacy base64 payload needs a re-encode.
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            return bytes(image_data)
+        quality = current_app.config.get("CAPTURE_JPEG_QUALITY", 90)
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return encoded.tobytes() if ok else b""
+
+    def _take_capture_images(self, session, key=None):
+        # The winners leave the session here and are written/uploaded by the
+        # capture persister once the event row exists. With a shared store a
+        # capture made by an earlier frame lives in the store, not the session.
+        stored = {}
+        if key is not None and (
+            (session.open_eye.captured and not session.open_eye.image)
+            or (session.closed_eye.captured and not session.closed_eye.image)
+        ):
+            stored = self.store.get_capture_images(key)
+
+        images = {}
+        for eye, bucket in (("open", session.open_eye), ("closed", session.closed_eye)):
+            image = bucket.image or stored.get(eye, b"")
+            if bucket.captured and image:
+                images[eye] = image
+            bucket.image = b""
+        return {"capture_images": images}
+
+    def _update_capture(self, session, eye_state, score, frame, image_data):
+        if eye_state not in {"OPEN", "CLOSED"}:
+            return False
 
-    @staticmethod
-    def _persist_capture_ref(file_path, email, token, eye_state):
-        if not file_path:
-            return ""
-
-        folder_base = current_app.config.get("CLOUDINARY_FOLDER", "eye-verification")
-        folder = f"{folder_base}/{eye_state.lower()}"
-        public_id = (
-            f"{sanitize_filename(email)}_"
-            f"{sanitize_filename(token)[:20]}_"
-            f"{eye_state.lower()}_{int(time.time() * 1000)}"
+        bucket = session.open_eye if eye_state == "OPEN" else session.closed_eye
+        if score <= bucket.score:
+            return False
+
+        started = time.perf_counter()
+        bucket.image = self._encode_capture(frame, image_data)
+        bucket.score = score
+        bucket.captured = True
+        self._observe_stage("capture", started)
+        return True
+
+    @contextmanager
+    def _session_slot(self, key):
+        with self.lock:
+            slot = self.session_slots.get(key)
+            if slot is None:
+                slot = _SessionSlot()
+                self.session_slots[key] = slot
+            slot.holders += 1
+
+        try:
+            with slot.lock:
+                yield slot
+        finally:
+            with self.lock:
+                slot.holders -= 1
+                if slot.holders == 0:
+                    self.session_slots.pop(key, None)
+
+    def _forget_session(self, key):
+        self.prefilter.forget(key)
+        self.admission.forget(key)
+        if self.detector_pool is not None:
+            self.detector_pool.unbind(key)
+
+    def _reap_session(self, key, email, token):
+        # Runs on the reaper thread when a session's deadline passes. Sessions
+        # that timed out without a final frame are closed and logged as failed;
+        # their tombstone is deleted one timeout later like finished sessions.
+        # By then the user is no longer PENDING, which the routes check before
+        # a frame can start a new session on the same token.
+        timeout_seconds = current_app.config.get(
+            "LIVENESS_TIMEOUT_SECONDS",
+            LIVENESS_TIMEOUT_SECONDS,
+        )
+        store = self._ensure_store()
+        with self._session_slot(key):
+            session = store.get(key)
+            if session is None:
+                self._forget_session(key)
+                return
+            if session.closed:
+                if session.timed_out and not session.has_expired(2 * timeout_seconds):
+                    # Another process's reaper timed it out just now; its
+                    # tombstone stays for one more timeout.
+                    self.reaper.schedule(session.started_at + 2 * timeout_seconds, key, email, token)
+                    return
+                store.delete(key)
+                self._forget_session(key)
+                return
+            if not session.has_expired(timeout_seconds):
+                self.reaper.schedule(session.started_at + timeout_seconds, key, email, token)
+                return
+
+            self._release_session(session)
+            session.timed_out = True
+            images = self._take_capture_images(session, key)["capture_images"]
+            if not store.put(key, session):
+                # A frame handled by another process got in first; look again.
+                self.reaper.schedule(time.time() + 1.0, key, email, token)
+                return
+            self._forget_session(key)
+            self.reaper.schedule(time.time() + timeout_seconds, key, email, token)
+
+        app = current_app._get_current_object()
+        pending_event = outcome_writer.submit(
+            app,
+            email=email,
+            status="FAILED",
+            reason="Liveness check timed out.",
+            open_captured=session.open_eye.captured,
+            closed_captured=session.closed_eye.captured,
+            token=token,
         )
-        cloud_url = upload_capture(file_path=file_path, folder=folder, public_id=public_id)
-        if cloud_url:
-            return cloud_url
-        return file_path.replace("\\", "/")
-
-    def _finalize_capture_refs(self, session, email, token):
-        if session.open_eye.captured and not session.open_eye.storage_ref:
-            session.open_eye.storage_ref = self._persist_capture_ref(
-                session.open_eye.file_path,
-                email,
-                token,
-                "open",
-            )
-        if session.closed_eye.captured and not session.closed_eye.storage_ref:
-            session.closed_eye.storage_ref = self._persist_capture_ref(
-                session.closed_eye.file_path,
-                email,
-                token,
-                "closed",
-            )
 
-        return {
-            "open_capture_ref": session.open_eye.storage_ref or "",
-            "closed_capture_ref": session.closed_eye.storage_ref or "",
-        }
+        def persist_captures(done):
+            # Like a timed-out final frame, the winners go on the FAILED event.
+            if done.exception() is None:
+                capture_persister.submit(app, done.result(), email, token, images)
 
-    def _update_capture(self, session, eye_state, score, frame, email):
-        if eye_state not in {"OPEN", "CLOSED"}:
+        if images:
+            pending_event.add_done_callback(persist_captures)
+
+    def _sweep_shared_store(self):
+        # Shared stores can hold sessions of processes that died before their
+        # reaper ran; clear those well after their owner would have.
+        if self.store is None or isinstance(self.store, InMemorySessionStore):
             return
+        timeout_seconds = current_app.config.get(
+            "LIVENESS_TIMEOUT_SECONDS",
+            LIVENESS_TIMEOUT_SECONDS,
+        )
+        self.store.purge_expired(2 * timeout_seconds)
+
+    @staticmethod
+    def _release_session(session):
+        # Finished sessions stay in the store until they expire so a frame that
+        # raced the final one cannot start a fresh verification.
+        session.closed = True
 
+    @staticmethod
+    def _capture_wanted(session, observation):
+        # A full-resolution frame is only worth its upload when the next one can
+        # become a capture: the eye state just seen has none yet, or this frame
+        # replaced the stored one. UNSURE, misaligned and rejected frames, and
+        # frames that did not beat the stored score, get the face crop. Once
+        # the eyes were seen open, every frame stays full until a closed-eye
+        # capture exists: a blink can last a single frame, and a crop of it
+        # cannot become the capture.
+        if session.closed:
+            return False
+        if session.saw_open_before_close and not session.closed_eye.captured:
+            return True
+        eye_state = observation.get("eye_state")
         if eye_state == "OPEN":
             bucket = session.open_eye
-            target_dir = current_app.config["OPEN_EYE_UPLOAD_DIR"]
-        else:
+        elif eye_state == "CLOSED" and session.saw_open_before_close:
             bucket = session.closed_eye
-            target_dir = current_app.config["CLOSED_EYE_UPLOAD_DIR"]
+        else:
+            return False
+        return not bucket.captured or observation.get("capture_improved", False)
+
+    def _next_frame_delay_ms(self, session):
+        # Sample faster while the blink is in progress (eyes seen open, reopen
+        # not yet seen) and back off in proportion to detector pool pressure.
+        # The hint never asks for frames faster than one inference takes.
+        config = current_app.config
+        delay = float(config.get("FRAME_CAPTURE_INTERVAL_MS", 200))
+        if session.saw_open_before_close and not session.saw_reopen_after_close:
+            delay *= config.get("FRAME_INTERVAL_BLINK_FACTOR", 0.5)
+
+        delay *= max(1.0, self.detector_pool.load())
+        delay = max(delay, self.inference_ms)
+        minimum = config.get("FRAME_INTERVAL_MIN_MS", 60)
+        maximum = config.get("FRAME_INTERVAL_MAX_MS", 2000)
+        return int(min(max(delay, minimum), maximum))
 
-        if score <= bucket.score:
-            return
+    @staticmethod
+    def _busy_result(reason):
+        # Shed frames answer before any decode or store access; the route turns
+        # "busy" into a 429 and the client simply retries after the hint.
+        if reason == "at_capacity":
+            message = "Verification is at capacity. Please wait a moment."
+        else:
+            message = "Server is busy. Retrying..."
+        return {
+            "state": "pending",
+            "busy": True,
+            "reason": reason,
+            "message": message,
+            "next_frame_in_ms": current_app.config.get("ADMISSION_RETRY_MS", 500),
+        }
 
-        if bucket.file_path and os.path.exists(bucket.file_path):
-            os.remove(bucket.file_path)
+    def _stale_write_result(self, session):
+        # Another process wrote this session while the frame was analysed (shared
+        # stores only). Its changes win; this frame is dropped and re-sent.
+        return {
+            "state": "pending",
+            "message": "Hold steady, still checking...",
+            **self._base_status(session),
+            "capture": self._capture_profile(session, {}),
+            "next_frame_in_ms": self._next_frame_delay_ms(session),
+        }
 
-        bucket.file_path = self._save_frame(frame, target_dir, email, eye_state)
-        bucket.score = score
-        bucket.captured = True
+    def _closed_session_result(self, session):
+        # The frame that closed the session (or the reaper) already recorded the
+        # outcome; "recorded" tells the routes to only end the client's session.
+        if session.timed_out:
+            result = {"state": "failed", "message": "Liveness check timed out.", "recorded": True}
+        else:
+            result = {"state": "pending", "message": "Verification session already completed."}
+        return {
+            **result,
+            **self._base_status(session),
+            "capture": self._capture_profile(session, {}),
+            "next_frame_in_ms": self._next_frame_delay_ms(session),
+        }
 
-    def process_frame(self, email, token, image_data):
-        with self.lock:
-            if not self._ensure_detector():
-                return {
-                    "state": "failed",
-                    "message": (
-                        "Eye detection model is unavailable. "
-                        "Please verify MediaPipe installation."
-                    ),
-                    "open_captured": False,
-                    "closed_captured": False,
-                    "blink_open_seen": False,
-                    "blink_closed_seen": False,
-                    "blink_reopen_seen": False,
-                }
-
-            timeout_seconds = current_app.config.get(
-                "LIVENESS_TIMEOUT_SECONDS",
-                LIVENESS_TIMEOUT_SECONDS,
-            )
-            expired_keys = [
-                session_key
-                for session_key, tracked_session in self.sessions.items()
-                if tracked_session.has_expired(timeout_seconds)
+    def _record_inference_latency(self, elapsed_ms):
+        self.inference_ms += _LATENCY_SMOOTHING * (elapsed_ms - self.inference_ms)
+
+    def _observe_stage(self, stage, started):
+        if self.stage_observer is not None:
+            self.stage_observer(stage, (time.perf_counter() - started) * 1000.0)
+
+    def _capture_profile(self, session, observation):
+        # Tells the client what to upload next: a full-resolution frame when it
+        # could become a capture, otherwise a downscaled crop around the face.
+        face_box = observation.get("face_box")
+        roi = None
+        if face_box is not None:
+            source_height, source_width = observation["source_shape"][:2]
+            roi = [
+                round(face_box.x / float(source_width), 4),
+                round(face_box.y / float(source_height), 4),
+                round(face_box.width / float(source_width), 4),
+                round(face_box.height / float(source_height), 4),
             ]
-            for expired_key in expired_keys:
-                self.sessions.pop(expired_key, None)
-
-            key = self._session_key(email, token)
-            session = self.sessions.get(key)
-            if not session:
-                session = LivenessSession()
-                self.sessions[key] = session
-
-            if session.has_expired(timeout_seconds):
-                self.sessions.pop(key, None)
-                return {
-                    "state": "failed",
-                    "message": "Liveness check timed out.",
-                    **self._base_status(session),
-                    **self._finalize_capture_refs(session, email, token),
-                }
-
-            frame = decode_base64_image(image_data)
-            if frame is None:
-                return {
-                    "state": "pending",
-                    "message": "Invalid frame received.",
-                    **self._base_status(session),
-                }
-
-            eye_result = self.eye_detector.analyze(frame)
-            if eye_result["face_count"] == 0:
-                return {
-                    "state": "pending",
-                    "message": "No face detected. Look at the camera with your full face visible.",
-                    **self._base_status(session),
-                }
-            if eye_result["face_count"] > 1:
-                return {
-                    "state": "pending",
-                    "message": "Multiple faces detected. Keep one face in frame.",
-                    **self._base_status(session),
-                }
-
-            face_box = extract_face_box(eye_result["face_landmarks"], frame.shape)
-            aligned, alignment_msg = evaluate_face_alignment(face_box, frame.shape)
-            if not aligned:
-                return {
-                    "state": "pending",
-                    "message": alignment_msg,
-                    **self._base_status(session),
-                }
-
-            sharpness = compute_sharpness(frame)
-            if sharpness < MIN_FRAME_SHARPNESS:
-                return {
-                    "state": "pending",
-                    "message": "Hold steady for a clearer frame.",
-                    **self._base_status(session),
-                    "ear": eye_result["ear"],
-                }
-
-            center_ratio = 1.0 - (
-                abs(face_box.center_x - (frame.shape[1] / 2.0)) / float(frame.shape[1] / 2.0)
-            )
-            quality_score = sharpness + (center_ratio * 100.0)
+        return {"full": self._capture_wanted(session, observation), "roi": roi}
+
+    def process_frame(self, email, token, image_data, region=None):
+        if not self._ensure_detector():
+            return {
+                "state": "failed",
+                "message": (
+                    "Eye detection model is unavailable. "
+                    "Please verify MediaPipe installation."
+                ),
+                "open_captured": False,
+                "closed_captured": False,
+                "blink_open_seen": False,
+                "blink_closed_seen": False,
+                "blink_reopen_seen": False,
+            }
+
+        timeout_seconds = current_app.config.get(
+            "LIVENESS_TIMEOUT_SECONDS",
+            LIVENESS_TIMEOUT_SECONDS,
+        )
+        store = self._ensure_store()
+        if self.reaper.thread is None:
+            self.reaper.start(current_app._get_current_object())
+        key = self._session_key(email, token)
+
+        rejection = self.admission.try_admit(
+            key,
+            max_in_flight=current_app.config.get("MAX_IN_FLIGHT_FRAMES", 0),
+            max_sessions=current_app.config.get("MAX_ACTIVE_SESSIONS", 0),
+        )
+        if rejection is not None:
+            FRAMES_TOTAL.inc("shed")
+            return self._busy_result(rejection)
+
+        finished = False
+        try:
+            waited = time.perf_counter()
+            with self._session_slot(key):
+                self._observe_stage("session_lock_wait", waited)
+                session = store.get(key)
+                if session is None:
+                    session = LivenessSession()
+                # With a shared store the session may have started in another
+                # process; each process that admits it needs its own deadline
+                # to drop its admission and prefilter entries.
+                self.reaper.schedule_once(session.started_at + timeout_seconds, key, email, token)
+                if session.closed:
+                    finished = True
+                    FRAMES_TOTAL.inc("session_closed")
+                    return self._closed_session_result(session)
+
+                observation = {}
+                result = self._process_session_frame(
+                    key, session, image_data, timeout_seconds, region, observation
+                )
+                if not store.put(key, session):
+                    FRAMES_TOTAL.inc("stale_write")
+                    return self._stale_write_result(store.get(key) or session)
+                FRAMES_TOTAL.inc(observation.get("outcome", "other"))
+                finished = session.closed
+                if finished:
+                    self.prefilter.forget(key)
+                    self.detector_pool.unbind(key)
+                result["capture"] = self._capture_profile(session, observation)
+                result["next_frame_in_ms"] = self._next_frame_delay_ms(session)
+                return result
+        finally:
+            self.admission.release(key, finished=finished)
+
+    def _prefilter_frame(self, key, session, frame, observation):
+        config = current_app.config
+        if not config.get("PREFILTER_ENABLED", True):
+            return None, None
+
+        verdict, thumb, cached = self.prefilter.inspect(
+            key,
+            frame,
+            min_brightness=config.get("PREFILTER_MIN_BRIGHTNESS", 16),
+            min_detail=config.get("PREFILTER_MIN_DETAIL", 8.0),
+            duplicate_diff=config.get("PREFILTER_DUPLICATE_DIFF", 6),
+        )
+        if verdict != "passed":
+            observation["outcome"] = verdict
+        if verdict == "dark":
+            return {
+                "state": "pending",
+                "message": "Too dark to see your face. Add light in front of you.",
+                **self._base_status(session),
+            }, thumb
+        if verdict == "featureless":
+            return {
+                "state": "pending",
+                "message": "Camera image is blurred or blocked. Hold steady in front of the camera.",
+                **self._base_status(session),
+            }, thumb
+        if verdict == "duplicate":
+            observation.update(cached["observation"], outcome="duplicate", capture_improved=False)
+            return {**cached["result"], **self._base_status(session)}, thumb
+        return None, thumb
+
+    @staticmethod
+    def _sharpness_scale(upload_box, source_box, max_side):
+        # Thresholds are calibrated on full-resolution face boxes. Downscaling
+        # packs the same edges into fewer pixels and both estimators read
+        # roughly the square of the factor higher, so a client-downscaled crop
+        # needs a proportionally higher threshold to reject the same blur.
+        upload_side = max(upload_box.width, upload_box.height)
+        source_side = max(source_box.width, source_box.height)
+        if max_side:
+            upload_side = min(upload_side, max_side)
+            source_side = min(source_side, max_side)
+        factor = source_side / float(max(1, upload_side))
+        return max(1.0, factor) ** 2
+
+    def _process_session_frame(self, key, session, image_data, timeout_seconds, region, observation):
+        if session.has_expired(timeout_seconds):
+            self._release_session(session)
+            session.timed_out = True
+            observation["outcome"] = "timed_out"
+            return {
+                "state": "failed",
+                "message": "Liveness check timed out.",
+                **self._base_status(session),
+                **self._take_capture_images(session, key),
+            }
+
+        started = time.perf_counter()
+        frame = decode_frame(image_data)
+        self._observe_stage("decode", started)
+        if frame is None:
+            observation["outcome"] = "invalid_frame"
+            return {
+                "state": "pending",
+                "message": "Invalid frame received.",
+                **self._base_status(session),
+            }
+
+        started = time.perf_counter()
+        early_result, thumb = self._prefilter_frame(key, session, frame, observation)
+        self._observe_stage("prefilter", started)
+        if early_result is not None:
+            return early_result
+
+        result = self._evaluate_frame(key, session, frame, image_data, region, observation)
+        if thumb is not None and result["state"] == "pending":
+            self.prefilter.remember(key, thumb, result, observation)
+        return result
+
+    def _evaluate_frame(self, key, session, frame, image_data, region, observation):
+        waited = time.perf_counter()
+        # Same detector as the session's previous frame where possible, so
+        # FaceMesh tracks one face instead of re-detecting on every frame.
+        with self.detector_pool.acquire(key) as eye_detector:
+            started = time.perf_counter()
+            self._observe_stage("detector_wait", waited)
+            eye_result = eye_detector.analyze(frame, region)
+        self._record_inference_latency((time.perf_counter() - started) * 1000.0)
+        self._observe_stage("analyze", started)
+        if eye_result["face_count"] == 0:
+            observation["outcome"] = "no_face"
+            return {
+                "state": "pending",
+                "message": "No face detected. Look at the camera with your full face visible.",
+                **self._base_status(session),
+            }
+        if eye_result["face_count"] > 1:
+            observation["outcome"] = "multiple_faces"
+            return {
+                "state": "pending",
+                "message": "Multiple faces detected. Keep one face in frame.",
+                **self._base_status(session),
+            }
 
-            eye_state = eye_result["eye_state"]
-            if eye_state == "OPEN":
-                self._update_capture(
+        face_box = eye_result["face_box"]
+        source_shape = frame.shape
+        can_capture = True
+        if region is not None:
+            face_box = region.to_source(face_box, frame.shape)
+            source_shape = region.source_shape
+            can_capture = region.is_full_resolution(frame.shape)
+        observation["face_box"] = face_box
+        observation["source_shape"] = source_shape
+
+        started = time.perf_counter()
+        aligned, alignment_msg = evaluate_face_alignment(face_box, source_shape)
+        self._observe_stage("alignment", started)
+        if not aligned:
+            observation["outcome"] = "misaligned"
+            return {
+                "state": "pending",
+                "message": alignment_msg,
+                **self._base_status(session),
+            }
+
+        # Sharpness is measured on the face box in the uploaded frame's own pixels.
+        config = current_app.config
+        method = config.get("SHARPNESS_METHOD", "laplacian")
+        max_side = config.get("SHARPNESS_MAX_SIDE", 0)
+        started = time.perf_counter()
+        sharpness = compute_sharpness(
+            frame,
+            eye_result["face_box"],
+            method=method,
+            max_side=max_side,
+        )
+        self._observe_stage("sharpness", started)
+        min_sharpness = config.get("SHARPNESS_MIN", 0) or MIN_FACE_SHARPNESS[method]
+        if not can_capture:
+            min_sharpness *= self._sharpness_scale(eye_result["face_box"], face_box, max_side)
+        if sharpness < min_sharpness:
+            observation["outcome"] = "blurry"
+            return {
+                "state": "pending",
+                "message": "Hold steady for a clearer frame.",
+                **self._base_status(session),
+                "ear": eye_result["ear"],
+            }
+
+        center_ratio = 1.0 - (
+            abs(face_box.center_x - (source_shape[1] / 2.0)) / float(source_shape[1] / 2.0)
+        )
+        # Sharpness enters the score in multiples of its threshold (times the
+        # Laplacian one), so centering weighs the same for every estimator.
+        quality_score = (sharpness / min_sharpness) * MIN_FACE_SHARPNESS["laplacian"] + (
+            center_ratio * 100.0
+        )
+
+        eye_state = eye_result["eye_state"]
+        observation["outcome"] = eye_state.lower()
+        observation["eye_state"] = eye_state
+        if eye_state == "OPEN":
+            if can_capture:
+                observation["capture_improved"] = self._update_capture(
                     session=session,
                     eye_state="OPEN",
                     score=quality_score,
                     frame=frame,
-                    email=email,
+                    image_data=image_data,
                 )
-                if not session.saw_open_before_close:
-                    session.saw_open_before_close = True
-                elif session.saw_closed_after_open:
-                    session.saw_reopen_after_close = True
-            elif eye_state == "CLOSED":
-                if session.saw_open_before_close:
-                    session.saw_closed_after_open = True
-                    self._update_capture(
+            if not session.saw_open_before_close:
+                session.saw_open_before_close = True
+            elif session.saw_closed_after_open:
+                session.saw_reopen_after_close = True
+        elif eye_state == "CLOSED":
+            if session.saw_open_before_close:
+                session.saw_closed_after_open = True
+                if can_capture:
+                    observation["capture_improved"] = self._update_capture(
                         session=session,
                         eye_state="CLOSED",
                         score=quality_score,
                         frame=frame,
-                        email=email,
+                        image_data=image_data,
                     )
 
-            if (
-                session.open_eye.captured
-                and session.closed_eye.captured
-                and session.saw_open_before_close
-                and session.saw_closed_after_open
-                and session.saw_reopen_after_close
-            ):
-                self.sessions.pop(key, None)
-                return {
-                    "state": "verified",
-                    "message": "Blink verified successfully with open and closed eye captures.",
-                    **self._base_status(session),
-                    "ear": eye_result["ear"],
-                    **self._finalize_capture_refs(session, email, token),
-                }
-
-            if eye_result["eye_state"] == "UNSURE":
-                message = (
-                    "Blink naturally while keeping your face centered. "
-                    "If wearing glasses, remove them for better detection."
-                )
-            else:
-                message = f"{self._blink_stage_message(session)} {self._capture_message(session)}"
-
+        if (
+            session.open_eye.captured
+            and session.closed_eye.captured
+            and session.saw_open_before_close
+            and session.saw_closed_after_open
+            and session.saw_reopen_after_close
+        ):
+            self._release_session(session)
             return {
-                "state": "pending",
-                "message": message,
+                "state": "verified",
+                "message": "Blink verified successfully with open and closed eye captures.",
                 **self._base_status(session),
                 "ear": eye_result["ear"],
+                **self._take_capture_images(session, key),
             }
 
+        if eye_result["eye_state"] == "UNSURE":
+            message = (
+                "Blink naturally while keeping your face centered. "
+                "If wearing glasses, remove them for better detection."
+            )
+        else:
+            message = f"{self._blink_stage_message(session)} {self._capture_message(session)}"
+
+        return {
+            "state": "pending",
+            "message": message,
+            **self._base_status(session),
+            "ear": eye_result["ear"],
+        }
+
 
-liveness_manager = LivenessManager()
+liveness_manager = LivenessManager(stage_observer=observe_stage)
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+
+from models.user import (
+    claim_outbound_emails,
+    complete_outbound_email,
+    enqueue_outbound_email,
+    retry_outbound_email,
+)
+from services.email_service import email_circuit_retry_in, send_verification_email
+
+
+STALE_CLAIM_SECONDS = 300
+
+
+class MailQueue:
+    def __init__(self):
+        self.app = None
+        self.workers = []
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def start(self, app):
+        if self.workers:
+            return
+        self.app = app
+        for index in range(max(1, app.config.get("MAIL_QUEUE_WORKERS", 2))):
+            worker = threading.Thread(
+                target=self._run,
+                name=f"mail-queue-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def enqueue(self, recipient, token, base_url=""):
+        email_id = enqueue_outbound_email(recipient, token, base_url)
+        self.wakeup.set()
+        return email_id
+
+    def _run(self):
+        poll_seconds = self.app.config.get("MAIL_QUEUE_POLL_SECONDS", 2.0)
+        while not self.stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self._drain_once()
+            except Exception as exc:
+                self.app.logger.exception("Mail queue worker failed: %s", exc)
+                processed = 0
+
+            if not processed:
+                self.wakeup.wait(poll_seconds)
+                self.wakeup.clear()
+
+    def _drain_once(self):
+        batch = claim_outbound_emails(limit=5, stale_after_seconds=STALE_CLAIM_SECONDS)
+        for item in batch:
+            self._deliver(item)
+        return len(batch)
+
+    def _deliver(self, item):
+        blocked_for = email_circuit_retry_in()
+        if blocked_for > 0:
+            # Every provider is behind an open breaker, so nothing would be sent:
+            # wait for the breaker instead of spending one of the row's attempts.
+            retry_outbound_email(
+                item["id"],
+                attempts=item["attempts"],
+                next_attempt_at=time.time() + blocked_for + random.uniform(0, 1),
+                error="All email providers are paused after repeated failures.",
+            )
+            return
+
+        sent, _, error = send_verification_email(
+            item["recipient"],
+            item["token"],
+            base_url_override=item["base_url"] or None,
+        )
+        if sent:
+            complete_outbound_email(item["id"])
+            return
+
+        attempts = item["attempts"] + 1
+        max_attempts = self.app.config.get("MAIL_QUEUE_MAX_ATTEMPTS", 6)
+        base_delay = self.app.config.get("MAIL_QUEUE_BACKOFF_SECONDS", 15)
+        delay = min(base_delay * (2 ** (attempts - 1)), 3600) * random.uniform(0.8, 1.2)
+        give_up = attempts >= max_attempts
+        retry_outbound_email(
+            item["id"],
+            attempts=attempts,
+            next_attempt_at=time.time() + delay,
+            error=error,
+            give_up=give_up,
+        )
+        if give_up:
+            self.app.logger.error(
+                "Giving up on verification email to %s after %s attempts: %s",
+                item["recipient"],
+                attempts,
+                error,
+            )
+        else:
+            self.app.logger.warning(
+                "Verification email to %s failed (attempt %s), retrying in %.0fs: %s",
+                item["recipient"],
+                attempts,
+                delay,
+                error,
+            )
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,134 @@
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+
+from models.user import record_verification_outcomes
+
+
+class OutcomeWriter:
+    # Writes each finished verification (status update + event + rollups) in
+    # one transaction. With OUTCOME_BATCH_WINDOW_MS > 0, outcomes from
+    # concurrent sessions are collected for up to that long (or until
+    # OUTCOME_BATCH_MAX_SIZE) and committed together by one writer thread.
+    # submit() returns a Future of the event id either way.
+    def __init__(self):
+        self.app = None
+        self.pending = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopping = False
+
+    def submit(
+        self,
+        app,
+        email,
+        status,
+        reason="",
+        open_captured=False,
+        closed_captured=False,
+        token="",
+    ):
+        outcome = {
+            "email": email,
+            "status": status,
+            "reason": reason,
+            "open_captured": open_captured,
+            "closed_captured": closed_captured,
+            "token": token,
+        }
+        future = Future()
+        if app.config.get("OUTCOME_BATCH_WINDOW_MS", 0) <= 0:
+            self._write(app, [(outcome, future)])
+            return future
+
+        with self.condition:
+            if not self.stopping:
+                self._ensure_thread(app)
+                self.pending.append((outcome, future))
+                # Wake the writer to open a batch window, or to cut it short.
+                if len(self.pending) == 1 or len(self.pending) >= app.config.get(
+                    "OUTCOME_BATCH_MAX_SIZE", 100
+                ):
+                    self.condition.notify()
+                return future
+
+        # Submitted during shutdown: nobody is left to batch it.
+        self._write(app, [(outcome, future)])
+        return future
+
+    def _ensure_thread(self, app):
+        if self.thread is not None:
+            return
+        self.app = app
+        self.thread = threading.Thread(target=self._run, name="outcome-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _next_batch(self):
+        window_seconds = self.app.config.get("OUTCOME_BATCH_WINDOW_MS", 0) / 1000.0
+        max_size = self.app.config.get("OUTCOME_BATCH_MAX_SIZE", 100)
+        with self.condition:
+            while not self.pending and not self.stopping:
+                self.condition.wait()
+
+            # The window starts with the first outcome of the batch, so no
+            # outcome waits longer than window_seconds for its commit.
+            flush_at = time.monotonic() + window_seconds
+            while len(self.pending) < max_size and not self.stopping:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = self.pending[:max_size]
+            del self.pending[:max_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(self.app, batch)
+            elif self.stopping:
+                return
+
+    def _write(self, app, batch):
+        with app.app_context():
+            try:
+                event_ids = record_verification_outcomes([outcome for outcome, _ in batch])
+            except Exception as exc:
+                if len(batch) == 1:
+                    app.logger.exception(
+                        "Recording verification outcome for %s failed: %s",
+                        batch[0][0]["email"],
+                        exc,
+                    )
+                    batch[0][1].set_exception(exc)
+                    return
+                # Keep one bad outcome from failing the whole batch.
+                for item in batch:
+                    self._write(app, [item])
+                return
+
+        for (_, future), event_id in zip(batch, event_ids):
+            future.set_result(event_id)
+
+    def flush(self, timeout_seconds=10.0):
+        # Registered with atexit once the writer thread exists: stop taking
+        # new outcomes into the queue and commit everything already queued.
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+            thread = self.thread
+        if thread is not None:
+            thread.join(timeout_seconds)
+
+        with self.condition:
+            leftover = self.pending
+            self.pending = []
+        if leftover:
+            self._write(self.app, leftover)
+
+
+outcome_writer = OutcomeWriter()
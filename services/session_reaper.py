@@ -0,0 +1,89 @@
+import heapq
+import threading
+import time
+
+
+class SessionReaper:
+    # Min-heap of (deadline, key, email, token) served by one background thread, so
+    # expiry costs O(log n) per session instead of a scan per frame and
+    # abandoned sessions are reclaimed even when no more frames arrive.
+    def __init__(self, callback, sweep=None, sweep_interval_seconds=60.0):
+        self.callback = callback
+        self.sweep = sweep
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.heap = []
+        # Heap entries per key, so a process can tell whether it already
+        # watches a session another process started.
+        self.scheduled = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self, app):
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(
+                target=self._run,
+                args=(app,),
+                name="liveness-session-reaper",
+                daemon=True,
+            )
+            self.thread.start()
+
+    def schedule(self, deadline, key, email, token):
+        entry = (deadline, key, email, token)
+        with self.condition:
+            self._push(entry)
+
+    def schedule_once(self, deadline, key, email, token):
+        # Schedules only when this reaper holds no deadline for the key yet.
+        with self.condition:
+            if key not in self.scheduled:
+                self._push((deadline, key, email, token))
+
+    def _push(self, entry):
+        heapq.heappush(self.heap, entry)
+        self.scheduled[entry[1]] = self.scheduled.get(entry[1], 0) + 1
+        if self.heap[0] is entry:
+            self.condition.notify()
+
+    def _pop(self):
+        entry = heapq.heappop(self.heap)
+        remaining = self.scheduled[entry[1]] - 1
+        if remaining:
+            self.scheduled[entry[1]] = remaining
+        else:
+            del self.scheduled[entry[1]]
+        return entry
+
+    def pending(self):
+        with self.condition:
+            return len(self.heap)
+
+    def _next_due(self, next_sweep_at):
+        with self.condition:
+            while True:
+                now = time.time()
+                if self.heap and self.heap[0][0] <= now:
+                    return self._pop()
+                if self.sweep is not None and now >= next_sweep_at:
+                    return None
+                wake_at = next_sweep_at if self.sweep is not None else now + 3600.0
+                if self.heap:
+                    wake_at = min(wake_at, self.heap[0][0])
+                self.condition.wait(max(0.0, wake_at - now))
+
+    def _run(self, app):
+        next_sweep_at = time.time() + self.sweep_interval_seconds
+        while True:
+            entry = self._next_due(next_sweep_at)
+            try:
+                with app.app_context():
+                    if entry is None:
+                        next_sweep_at = time.time() + self.sweep_interval_seconds
+                        self.sweep()
+                    else:
+                        _, key, email, token = entry
+                        self.callback(key, email, token)
+            except Exception as exc:
+                app.logger.exception("Liveness session reaper failed: %s", exc)
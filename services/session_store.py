@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+import time
+
+from models.user import (
+    delete_liveness_session_state,
+    load_liveness_session_captures,
+    load_liveness_session_state,
+    purge_liveness_session_states,
+    save_liveness_session_state,
+)
+
+
+class SessionStore:
+    def get(self, key):
+        raise NotImplementedError
+
+    def put(self, key, session):
+        # Returns False when the write was rejected because another process
+        # changed the session since it was read; the caller's changes are lost.
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def purge_expired(self, timeout_seconds):
+        raise NotImplementedError
+
+    def get_capture_images(self, key):
+        # {eye: jpeg bytes} of captures kept outside the session object.
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.sessions.get(key)
+
+    def put(self, key, session):
+        with self.lock:
+            self.sessions[key] = session
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            self.sessions.pop(key, None)
+
+    def purge_expired(self, timeout_seconds):
+        with self.lock:
+            expired_keys = [
+                session_key
+                for session_key, tracked_session in self.sessions.items()
+                if tracked_session.has_expired(timeout_seconds)
+            ]
+            for expired_key in expired_keys:
+                self.sessions.pop(expired_key, None)
+        return len(expired_keys)
+
+
+class _SerializedSessionStore(SessionStore):
+    def __init__(self, session_cls):
+        self.session_cls = session_cls
+
+    def _read(self, key):
+        raise NotImplementedError
+
+    def _write(self, key, started_at, state, version, captures, clear_captures):
+        # Returns the new version, or None if the stored version moved on.
+        raise NotImplementedError
+
+    def get(self, key):
+        row = self._read(key)
+        if row is None:
+            return None
+        state, version = row
+        session = self.session_cls.from_state(state)
+        session.stored_state = state
+        session.stored_version = version
+        return session
+
+    def put(self, key, session):
+        state = session.to_state()
+        # Most frames (no face, misaligned, repeated eye state) leave the session
+        # untouched, so skip the write when nothing changed since it was loaded.
+        if state == session.stored_state:
+            return True
+        # The state carries scores only. Images set on the session are the
+        # captures this frame improved; they go to their own rows, and a
+        # finished session's rows are dropped.
+        buckets = (("open", session.open_eye), ("closed", session.closed_eye))
+        captures = {eye: bucket.image for eye, bucket in buckets if bucket.image}
+        version = self._write(
+            key,
+            session.started_at,
+            state,
+            session.stored_version,
+            captures,
+            session.closed,
+        )
+        if version is None:
+            return False
+        for _, bucket in buckets:
+            bucket.image = b""
+        session.stored_state = state
+        session.stored_version = version
+        return True
+
+
+class DatabaseSessionStore(_SerializedSessionStore):
+    def _read(self, key):
+        return load_liveness_session_state(key)
+
+    def _write(self, key, started_at, state, version, captures, clear_captures):
+        return save_liveness_session_state(
+            key,
+            started_at,
+            state,
+            version,
+            captures=captures,
+            clear_captures=clear_captures,
+        )
+
+    def get_capture_images(self, key):
+        return load_liveness_session_captures(key)
+
+    def delete(self, key):
+        delete_liveness_session_state(key)
+
+    def purge_expired(self, timeout_seconds):
+        return purge_liveness_session_states(time.time() - timeout_seconds)
+
+
+class SqliteSessionStore(_SerializedSessionStore):
+    def __init__(self, session_cls, path):
+        super().__init__(session_cls)
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS liveness_sessions ("
+            "session_key TEXT PRIMARY KEY, "
+            "started_at REAL NOT NULL, "
+            "state TEXT NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(liveness_sessions)")}
+        if "version" not in columns:
+            connection.execute(
+                "ALTER TABLE liveness_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_liveness_sessions_started_at "
+            "ON liveness_sessions (started_at)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS liveness_session_captures ("
+            "session_key TEXT NOT NULL, "
+            "eye TEXT NOT NULL, "
+            "started_at REAL NOT NULL, "
+            "image BLOB NOT NULL, "
+            "PRIMARY KEY (session_key, eye))"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_liveness_session_captures_started_at "
+            "ON liveness_session_captures (started_at)"
+        )
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _read(self, key):
+        row = self._connection().execute(
+            "SELECT state, version FROM liveness_sessions WHERE session_key = ?",
+            (key,),
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _write(self, key, started_at, state, version, captures, clear_captures):
+        connection = self._connection()
+        with connection:
+            if version is None:
+                cursor = connection.execute(
+                    "INSERT INTO liveness_sessions (session_key, started_at, state, version) "
+                    "VALUES (?, ?, ?, 1) ON CONFLICT(session_key) DO NOTHING",
+                    (key, started_at, state),
+                )
+            else:
+                cursor = connection.execute(
+                    "UPDATE liveness_sessions SET started_at = ?, state = ?, version = version + 1 "
+                    "WHERE session_key = ? AND version = ?",
+                    (started_at, state, key, version),
+                )
+            if not cursor.rowcount:
+                return None
+            if clear_captures:
+                connection.execute(
+                    "DELETE FROM liveness_session_captures WHERE session_key = ?",
+                    (key,),
+                )
+            else:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO liveness_session_captures "
+                    "(session_key, eye, started_at, image) VALUES (?, ?, ?, ?)",
+                    [(key, eye, started_at, image) for eye, image in captures.items()],
+                )
+        return 1 if version is None else version + 1
+
+    def get_capture_images(self, key):
+        rows = self._connection().execute(
+            "SELECT eye, image FROM liveness_session_captures WHERE session_key = ?",
+            (key,),
+        ).fetchall()
+        return {eye: bytes(image) for eye, image in rows}
+
+    def delete(self, key):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM liveness_session_captures WHERE session_key = ?", (key,))
+            connection.execute("DELETE FROM liveness_sessions WHERE session_key = ?", (key,))
+
+    def purge_expired(self, timeout_seconds):
+        cutoff = time.time() - timeout_seconds
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "DELETE FROM liveness_session_captures WHERE started_at < ?",
+                (cutoff,),
+            )
+            cursor = connection.execute(
+                "DELETE FROM liveness_sessions WHERE started_at < ?",
+                (cutoff,),
+            )
+        return cursor.rowcount
+
+
+def create_session_store(kind, session_cls, sqlite_path=""):
+    if kind == "memory":
+        return InMemorySessionStore()
+    if kind == "database":
+        return DatabaseSessionStore(session_cls)
+    if kind == "sqlite":
+        return SqliteSessionStore(session_cls, sqlite_path)
+    raise ValueError(f"Unknown liveness session store: {kind}")
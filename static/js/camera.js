@@ -3,6 +3,9 @@
     const frameIntervalMs = Number(body.dataset.frameInterval || "200");
     const verifiedEmail = body.dataset.email || "";
     const verifiedToken = body.dataset.token || "";
+    const streamEnabled = body.dataset.streamEnabled === "true";
+    const uploadWidth = Number(body.dataset.uploadWidth || "0");
+    const roiPadding = Number(body.dataset.roiPadding || "0");
 
     const video = document.getElementById("webcam");
     const statusText = document.getElementById("status-text");
@@ -17,9 +20,13 @@
 
     let stream = null;
     let timerId = null;
+    let socket = null;
+    let streamTimerId = null;
     let requestInFlight = false;
     let finished = false;
     let failureCount = 0;
+    let captureProfile = { full: true, roi: null };
+    let nextFrameDelayMs = frameIntervalMs;
     let startedAt = Date.now();
 
     async function startWebcam() {
@@ -35,21 +42,75 @@
             video.srcObject = stream;
             await video.play();
             statusText.textContent = "Camera active. Keep one centered face and blink naturally.";
-            timerId = window.setInterval(processFrame, frameIntervalMs);
+            if (streamEnabled && "WebSocket" in window) {
+                startStreaming();
+            } else {
+                startPolling();
+            }
         } catch (error) {
             statusText.textContent = "Unable to access webcam. Allow camera permission and retry.";
             finish("failed");
         }
     }
 
-    function captureFrameAsBase64() {
-        if (!video.videoWidth || !video.videoHeight) {
-            return null;
+    function frameRegion(sourceWidth, sourceHeight) {
+        if (captureProfile.full || !captureProfile.roi) {
+            return { x: 0, y: 0, width: sourceWidth, height: sourceHeight };
+        }
+
+        // Pad the previous face box so small head movements stay inside the crop.
+        const [roiX, roiY, roiWidth, roiHeight] = captureProfile.roi;
+        const padX = roiWidth * roiPadding;
+        const padY = roiHeight * roiPadding;
+        const left = Math.max(0, Math.floor((roiX - padX) * sourceWidth));
+        const top = Math.max(0, Math.floor((roiY - padY) * sourceHeight));
+        const right = Math.min(sourceWidth, Math.ceil((roiX + roiWidth + padX) * sourceWidth));
+        const bottom = Math.min(sourceHeight, Math.ceil((roiY + roiHeight + padY) * sourceHeight));
+        if (right - left < 16 || bottom - top < 16) {
+            return { x: 0, y: 0, width: sourceWidth, height: sourceHeight };
         }
-        canvas.width = video.videoWidth;
-        canvas.height = video.videoHeight;
-        context.drawImage(video, 0, 0, canvas.width, canvas.height);
-        return canvas.toDataURL("image/jpeg", 0.85);
+        return { x: left, y: top, width: right - left, height: bottom - top };
+    }
+
+    function captureFrameAsBlob() {
+        const sourceWidth = video.videoWidth;
+        const sourceHeight = video.videoHeight;
+        if (!sourceWidth || !sourceHeight) {
+            return Promise.resolve(null);
+        }
+
+        const region = frameRegion(sourceWidth, sourceHeight);
+        let scale = 1;
+        if (!captureProfile.full && uploadWidth > 0 && region.width > uploadWidth) {
+            scale = uploadWidth / region.width;
+        }
+        canvas.width = Math.max(1, Math.round(region.width * scale));
+        canvas.height = Math.max(1, Math.round(region.height * scale));
+        context.drawImage(
+            video,
+            region.x,
+            region.y,
+            region.width,
+            region.height,
+            0,
+            0,
+            canvas.width,
+            canvas.height
+        );
+
+        const regionHeader = [
+            region.x,
+            region.y,
+            region.width,
+            region.height,
+            sourceWidth,
+            sourceHeight
+        ].join(",");
+        return new Promise((resolve) => {
+            canvas.toBlob((blob) => {
+                resolve(blob ? { blob: blob, region: regionHeader } : null);
+            }, "image/jpeg", 0.85);
+        });
     }
 
     function updateProgress(payload) {
@@ -72,6 +133,18 @@
     }
 
     function updateStatus(payload) {
+        if (payload.busy) {
+            // Shed frames carry no session progress, only a message and a retry hint.
+            nextFrameDelayMs = payload.next_frame_in_ms || frameIntervalMs;
+            statusText.textContent = payload.message || "Server is busy. Retrying...";
+            return;
+        }
+        if (payload.capture) {
+            captureProfile = payload.capture;
+        }
+        if (typeof payload.next_frame_in_ms === "number") {
+            nextFrameDelayMs = payload.next_frame_in_ms;
+        }
         statusText.textContent = payload.message || "Processing frame...";
         openText.textContent = "Open-eye: " + (payload.open_captured ? "captured" : "pending");
         closedText.textContent = "Closed-eye: " + (payload.closed_captured ? "captured" : "pending");
@@ -86,30 +159,33 @@
     }
 
     async function processFrame() {
+        timerId = null;
         if (finished || requestInFlight) {
             return;
         }
 
-        const image = captureFrameAsBase64();
-        if (!image) {
-            return;
-        }
-
         requestInFlight = true;
+        let delay = frameIntervalMs;
         try {
+            const image = await captureFrameAsBlob();
+            if (!image) {
+                return;
+            }
+
             const response = await fetch("/process_frame", {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({
-                    image: image,
-                    email: verifiedEmail,
-                    token: verifiedToken
-                })
+                headers: {
+                    "Content-Type": "image/jpeg",
+                    "X-Verification-Email": encodeURIComponent(verifiedEmail),
+                    "X-Verification-Token": verifiedToken,
+                    "X-Frame-Region": image.region
+                },
+                body: image.blob
             });
             const payload = await response.json();
             updateStatus(payload);
 
-            if (!response.ok) {
+            if (!response.ok && !payload.busy) {
                 throw new Error(payload.message || "Frame processing failed.");
             }
 
@@ -118,6 +194,7 @@
             }
 
             failureCount = 0;
+            delay = nextFrameDelayMs;
         } catch (error) {
             failureCount += 1;
             statusText.textContent = error.message || "Connection issue during frame processing.";
@@ -127,14 +204,90 @@
             }
         } finally {
             requestInFlight = false;
+            scheduleFrame(delay);
         }
     }
 
+    function scheduleFrame(delay) {
+        // The server paces each client through next_frame_in_ms, so the next
+        // frame is only queued once the previous response has arrived.
+        if (!timerId && !finished) {
+            timerId = window.setTimeout(processFrame, delay);
+        }
+    }
+
+    function startPolling() {
+        scheduleFrame(0);
+    }
+
+    function startStreaming() {
+        const scheme = window.location.protocol === "https:" ? "wss://" : "ws://";
+        socket = new WebSocket(scheme + window.location.host + "/ws/liveness");
+        socket.addEventListener("open", () => {
+            socket.send(JSON.stringify({ email: verifiedEmail, token: verifiedToken }));
+        });
+        socket.addEventListener("message", handleStreamMessage);
+        socket.addEventListener("close", () => {
+            socket = null;
+            // Servers without WebSocket support (or a dropped stream) fall back to HTTP frames.
+            startPolling();
+        });
+    }
+
+    function handleStreamMessage(event) {
+        let payload = null;
+        try {
+            payload = JSON.parse(event.data);
+        } catch (error) {
+            return;
+        }
+
+        if (payload.state === "unavailable") {
+            socket.close();
+            return;
+        }
+        if (payload.state !== "ready") {
+            updateStatus(payload);
+        }
+        if (payload.state === "verified" || payload.state === "failed") {
+            finish(payload.state);
+            return;
+        }
+
+        // The server answers every frame, so the next one is only sent after the
+        // previous result arrives.
+        const delay = payload.state === "ready" ? 0 : nextFrameDelayMs;
+        streamTimerId = window.setTimeout(sendStreamFrame, delay);
+    }
+
+    async function sendStreamFrame() {
+        streamTimerId = null;
+        if (finished || !socket || socket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+
+        const image = await captureFrameAsBlob();
+        if (!image) {
+            streamTimerId = window.setTimeout(sendStreamFrame, frameIntervalMs);
+            return;
+        }
+        socket.send(JSON.stringify({ region: image.region }));
+        socket.send(image.blob);
+    }
+
     function stopStream() {
         if (timerId) {
-            window.clearInterval(timerId);
+            window.clearTimeout(timerId);
             timerId = null;
         }
+        if (streamTimerId) {
+            window.clearTimeout(streamTimerId);
+            streamTimerId = null;
+        }
+        if (socket) {
+            socket.close();
+            socket = null;
+        }
         if (stream) {
             stream.getTracks().forEach((track) => track.stop());
             stream = null;
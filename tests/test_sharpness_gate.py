@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+
+from config import Config
+from services.face_detection import FaceBox, FrameRegion
+from services.liveness_check import LivenessManager
+
+SOURCE_SHAPE = (720, 1280)
+SOURCE_FACE = FaceBox(x=440, y=160, width=400, height=400)
+CROP_REGION = FrameRegion(340, 60, 600, 600, SOURCE_SHAPE[1], SOURCE_SHAPE[0])
+UPLOAD_WIDTH = 320
+BLURRY_MESSAGE = "Hold steady for a clearer frame."
+
+
+class StubDetector:
+    # Reports one open-eyed face at SOURCE_FACE, in the uploaded frame's pixels.
+    def analyze(self, frame_bgr, region=None):
+        height, width = frame_bgr.shape[:2]
+        scale_x = width / float(region.width if region else SOURCE_SHAPE[1])
+        scale_y = height / float(region.height if region else SOURCE_SHAPE[0])
+        offset_x = region.x if region else 0
+        offset_y = region.y if region else 0
+        face_box = FaceBox(
+            x=int((SOURCE_FACE.x - offset_x) * scale_x),
+            y=int((SOURCE_FACE.y - offset_y) * scale_y),
+            width=int(SOURCE_FACE.width * scale_x),
+            height=int(SOURCE_FACE.height * scale_y),
+        )
+        return {
+            "face_count": 1,
+            "face_landmarks": None,
+            "face_box": face_box,
+            "ear": 0.3,
+            "eye_state": "OPEN",
+        }
+
+
+@pytest.fixture(params=["laplacian", "laplacian32", "tenengrad"])
+def app(request):
+    app = Flask("test_sharpness_gate")
+    app.config.from_object(Config)
+    app.config.update(
+        PREFILTER_ENABLED=False,
+        DETECTOR_POOL_SIZE=1,
+        LIVENESS_SESSION_STORE="memory",
+        SHARPNESS_METHOD=request.param,
+        SHARPNESS_MIN=0,
+        SHARPNESS_MAX_SIDE=0,
+    )
+    return app
+
+
+def _camera_frame(extra_blur):
+    # Fine texture softened like a camera image; extra_blur is defocus on top.
+    noise = (np.random.default_rng(0).random(SOURCE_SHAPE + (3,)) * 255).astype(np.uint8)
+    frame = cv2.GaussianBlur(noise, (0, 0), 1.0)
+    if extra_blur:
+        frame = cv2.GaussianBlur(frame, (0, 0), extra_blur)
+    return frame
+
+
+def _downscaled_crop(frame):
+    region = CROP_REGION
+    crop = frame[region.y:region.y + region.height, region.x:region.x + region.width]
+    upload_height = round(region.height * UPLOAD_WIDTH / float(region.width))
+    return cv2.resize(crop, (UPLOAD_WIDTH, upload_height), interpolation=cv2.INTER_AREA)
+
+
+def _jpeg(frame):
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    assert ok
+    return encoded.tobytes()
+
+
+def _process(app, frame, region=None):
+    manager = LivenessManager(detector_factory=StubDetector)
+    with app.app_context():
+        return manager.process_frame("gate@example.com", "token", _jpeg(frame), region=region)
+
+
+def test_blurry_full_resolution_frame_is_rejected(app):
+    assert _process(app, _camera_frame(extra_blur=2.0))["message"] == BLURRY_MESSAGE
+
+
+def test_downscaled_blurry_crop_is_rejected(app):
+    result = _process(app, _downscaled_crop(_camera_frame(extra_blur=2.0)), CROP_REGION)
+
+    assert result["message"] == BLURRY_MESSAGE
+    assert not result["blink_open_seen"]
+
+
+def test_downscaled_sharp_crop_passes(app):
+    result = _process(app, _downscaled_crop(_camera_frame(extra_blur=0)), CROP_REGION)
+
+    assert result["message"] != BLURRY_MESSAGE
+    assert result["blink_open_seen"]
@@ -12,4 +12,17 @@ FACE_CENTER_TOLERANCE = 0.30
 EAR_OPEN_THRESHOLD = 0.24
 EAR_CLOSED_THRESHOLD = 0.19
 
-MIN_FRAME_SHARPNESS = 20.0
+# FaceLandmarker eyeBlink blendshapes, averaged over both eyes:
+# 0 is wide open, 1 is fully closed.
+BLINK_SCORE_OPEN_THRESHOLD = 0.35
+BLINK_SCORE_CLOSED_THRESHOLD = 0.55
+
+# Lowest acceptable sharpness of the face box, in each estimator's own units
+# (Laplacian variance; Sobel gradient energy for tenengrad) at the resolution it
+# was measured. A box downsampled by SHARPNESS_MAX_SIDE reads on another scale
+# and needs its own SHARPNESS_MIN.
+MIN_FACE_SHARPNESS = {
+    "laplacian": 20.0,
+    "laplacian32": 20.0,
+    "tenengrad": 1200.0,
+}
@@ -1,5 +1,6 @@
 import base64
 import re
+import threading
 
 import cv2
 import numpy as np
@@ -18,14 +19,111 @@ def decode_base64_image(image_data):
     except (ValueError, TypeError):
         return None
 
-    image_array = np.frombuffer(binary_data, dtype=np.uint8)
+    return decode_image_bytes(binary_data)
+
+
+def decode_image_bytes(image_bytes):
+    if not image_bytes:
+        return None
+
+    # np.frombuffer wraps bytes/bytearray/memoryview without copying.
+    image_array = np.frombuffer(image_bytes, dtype=np.uint8)
     frame = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
     return frame
 
 
-def compute_sharpness(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+def decode_frame(image_data):
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        return decode_image_bytes(image_data)
+    return decode_base64_image(image_data)
+
+
+def read_stream_into_buffer(stream, content_length):
+    buffer = bytearray(content_length)
+    view = memoryview(buffer)
+    received = 0
+    while received < content_length:
+        chunk_size = stream.readinto(view[received:])
+        if not chunk_size:
+            break
+        received += chunk_size
+    return view[:received]
+
+
+_SHARPNESS_BUFFERS = threading.local()
+
+
+def _reusable_buffer(name, shape, dtype):
+    # Per-thread scratch arrays that only grow; each call takes a contiguous
+    # view of the size it needs, so varying face ROI sizes don't reallocate.
+    buffers = getattr(_SHARPNESS_BUFFERS, "buffers", None)
+    if buffers is None:
+        buffers = _SHARPNESS_BUFFERS.buffers = {}
+
+    size = int(np.prod(shape))
+    buffer = buffers.get(name)
+    if buffer is None or buffer.size < size or buffer.dtype != dtype:
+        buffer = np.empty(size, dtype=dtype)
+        buffers[name] = buffer
+    return buffer[:size].reshape(shape)
+
+
+def _laplacian_variance(gray, depth, dtype):
+    laplacian = _reusable_buffer("laplacian", gray.shape, dtype)
+    cv2.Laplacian(gray, depth, dst=laplacian)
+    _, std = cv2.meanStdDev(laplacian)
+    return float(std[0, 0]) ** 2
+
+
+def _tenengrad(gray):
+    energy = 0.0
+    for name, dx, dy in (("gradient_x", 1, 0), ("gradient_y", 0, 1)):
+        gradient = _reusable_buffer(name, gray.shape, np.float32)
+        cv2.Sobel(gray, cv2.CV_32F, dx, dy, dst=gradient)
+        mean, std = cv2.meanStdDev(gradient)
+        energy += float(std[0, 0]) ** 2 + float(mean[0, 0]) ** 2
+    return energy
+
+
+_SHARPNESS_ESTIMATORS = {
+    "laplacian": lambda gray: _laplacian_variance(gray, cv2.CV_64F, np.float64),
+    # uint8 Laplacian responses are small integers, exact in float32, so this
+    # matches "laplacian" at half the memory traffic.
+    "laplacian32": lambda gray: _laplacian_variance(gray, cv2.CV_32F, np.float32),
+    "tenengrad": _tenengrad,
+}
+
+SHARPNESS_METHODS = tuple(_SHARPNESS_ESTIMATORS)
+
+
+def compute_sharpness(frame, face_box=None, method="laplacian", max_side=0):
+    # Raw estimator value: no attempt is made to map estimators or downsampled
+    # boxes onto one scale, so compare against a threshold for the same setup.
+    if method not in _SHARPNESS_ESTIMATORS:
+        raise ValueError(f"Unknown sharpness method: {method}")
+
+    roi = frame
+    if face_box is not None:
+        frame_height, frame_width = frame.shape[:2]
+        x0 = max(0, face_box.x)
+        y0 = max(0, face_box.y)
+        x1 = min(frame_width, face_box.x + face_box.width)
+        y1 = min(frame_height, face_box.y + face_box.height)
+        if x1 - x0 >= 3 and y1 - y0 >= 3:
+            roi = frame[y0:y1, x0:x1]
+
+    height, width = roi.shape[:2]
+    gray = _reusable_buffer("gray", (height, width), np.uint8)
+    cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=gray)
+
+    if max_side and max(height, width) > max_side:
+        downscale = max(height, width) / float(max_side)
+        small_size = (max(3, round(width / downscale)), max(3, round(height / downscale)))
+        small = _reusable_buffer("small", (small_size[1], small_size[0]), np.uint8)
+        cv2.resize(gray, small_size, dst=small, interpolation=cv2.INTER_AREA)
+        gray = small
+
+    return _SHARPNESS_ESTIMATORS[method](gray)
 
 
 def sanitize_filename(value):